@@ -0,0 +1,102 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+from posts.utils import PAGE_SIZE
+
+
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestAuthor')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовое описание',
+            slug='test-slug',
+        )
+        for i in range(PAGE_SIZE + 3):
+            cls.post = Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=cls.user,
+                group=cls.group,
+            )
+        cls.FEED_URLS = (
+            reverse('api:posts'),
+            reverse('api:group_posts', args=[cls.group.slug]),
+            reverse('api:profile_posts', args=[cls.user.username]),
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_feeds_return_projection(self):
+        """Ленты отдают страницу постов с автором и группой."""
+        for url in self.FEED_URLS:
+            with self.subTest(url=url):
+                data = self.guest_client.get(url).json()
+                self.assertEqual(len(data['results']), PAGE_SIZE)
+                first = data['results'][0]
+                self.assertEqual(first['id'], self.post.id)
+                self.assertEqual(first['author'], self.user.username)
+                self.assertEqual(first['group'], self.group.slug)
+                self.assertIsNone(data['previous'])
+
+    def test_next_page(self):
+        """Ссылка next ведет на оставшиеся посты."""
+        data = self.guest_client.get(reverse('api:posts')).json()
+        data = self.guest_client.get(data['next']).json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertIsNone(data['next'])
+
+    def test_not_modified_without_serializing(self):
+        """Совпавший ETag дает 304 одним запросом к базе."""
+        url = reverse('api:posts')
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        """Last-Modified используется для условного запроса."""
+        url = reverse('api:posts')
+        last_modified = self.guest_client.get(url)['Last-Modified']
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_comments(self):
+        """Новый комментарий меняет ETag ленты и комментариев поста."""
+        urls = (
+            reverse('api:posts'),
+            reverse('api:post_comments', args=[self.post.id]),
+        )
+        etags = [self.guest_client.get(url)['ETag'] for url in urls]
+        Comment.objects.create(
+            text='Тестовый комментарий', author=self.user, post=self.post)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        data = self.guest_client.get(urls[1]).json()
+        self.assertEqual(data['results'][0]['text'], 'Тестовый комментарий')
+
+    def test_missing_parent(self):
+        """Для несуществующих группы, автора и поста возвращается 404."""
+        urls = (
+            reverse('api:group_posts', args=['missing']),
+            reverse('api:profile_posts', args=['missing']),
+            reverse('api:post_comments', args=[self.post.id + 1]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.guest_client.get(url).status_code, 404)
+
+    def test_read_only(self):
+        """API принимает только безопасные методы."""
+        response = self.guest_client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,147 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from core.routers import read_replica
+from posts.models import Comment, Group, Post, User
+from posts.utils import CURSOR_PARAM, get_cursor_page
+
+# Проекции ресурсов: имя поля в ответе -> выражение для values(),
+# и поля, по которым вычисляется версия записи для ETag.
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'created': 'created',
+    'updated': 'updated',
+    'comments_count': 'comments_count',
+    'image': 'image',
+}
+POST_VERSION = ('updated', 'comments_count')
+
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+COMMENT_VERSION = ('created',)
+
+
+def serialize_post(row):
+    row['image'] = default_storage.url(row['image']) if row['image'] else None
+    return row
+
+
+def get_validators(rows, version):
+    """ETag и Last-Modified страницы по идентификаторам и версиям записей.
+
+    Last-Modified - самое позднее значение первого поля версии.
+    """
+    digest = hashlib.md5()
+    for row in rows:
+        digest.update(
+            '|'.join(str(row[name]) for name in ('id', *version)).encode())
+        digest.update(b'\n')
+    modified = max((row[version[0]] for row in rows), default=None)
+    return (
+        quote_etag(digest.hexdigest()),
+        int(modified.timestamp()) if modified else None,
+    )
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    return response
+
+
+def get_page_url(request, cursor):
+    if cursor is None:
+        return None
+    return f'{request.path}?{urlencode({CURSOR_PARAM: cursor})}'
+
+
+def feed_response(request, queryset, parent, fields, version,
+                  serialize=None):
+    """Курсорная страница ресурса с поддержкой условных запросов.
+
+    Сначала выбираются только ключ курсора и поля версии: по ним
+    вычисляются валидаторы, и при совпадении клиент получает
+    304 без выборки и сериализации самих записей.
+    parent - queryset родительского объекта; он проверяется только
+    для пустой страницы, чтобы отличить пустую ленту от 404.
+    """
+    page = get_cursor_page(
+        queryset.values(*dict.fromkeys(('id', 'created', *version))),
+        request.GET.get(CURSOR_PARAM),
+    )
+    if not page.object_list and parent is not None and not parent.exists():
+        raise Http404
+    etag, last_modified = get_validators(page, version)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return set_validators(response, etag, last_modified)
+    ids = [row['id'] for row in page]
+    rows = {
+        row['id']: {name: row[lookup] for name, lookup in fields.items()}
+        for row in queryset.filter(pk__in=ids).values(*fields.values())
+    } if ids else {}
+    results = [rows[pk] for pk in ids if pk in rows]
+    if serialize is not None:
+        results = [serialize(row) for row in results]
+    response = JsonResponse({
+        'results': results,
+        'next': get_page_url(request, page.next_cursor),
+        'previous': get_page_url(request, page.previous_cursor),
+    })
+    return set_validators(response, etag, last_modified)
+
+
+@read_replica
+@require_safe
+def posts(request):
+    """Лента всех постов."""
+    return feed_response(
+        request, Post.objects.all(), None,
+        POST_FIELDS, POST_VERSION, serialize_post)
+
+
+@read_replica
+@require_safe
+def group_posts(request, slug):
+    """Посты группы."""
+    return feed_response(
+        request, Post.objects.filter(group__slug=slug),
+        Group.objects.filter(slug=slug),
+        POST_FIELDS, POST_VERSION, serialize_post)
+
+
+@read_replica
+@require_safe
+def profile_posts(request, username):
+    """Посты автора."""
+    return feed_response(
+        request, Post.objects.filter(author__username=username),
+        User.objects.filter(username=username),
+        POST_FIELDS, POST_VERSION, serialize_post)
+
+
+@read_replica
+@require_safe
+def post_comments(request, post_id):
+    """Комментарии поста, новые сначала."""
+    return feed_response(
+        request, Comment.objects.filter(post_id=post_id),
+        Post.objects.filter(pk=post_id),
+        COMMENT_FIELDS, COMMENT_VERSION)
@@ -0,0 +1,4 @@
+"""Нагрузочные замеры представлений ленты.
+
+Запуск: python manage.py benchmark (см. README).
+"""
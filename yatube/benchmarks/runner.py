@@ -0,0 +1,146 @@
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from core.instrumentation import collect
+from posts.models import Group, Post
+from users.models import Profile
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+ITERATIONS: int = 20
+WARMUP: int = 2
+# Допустимое превышение базовых значений. Время шумит сильнее,
+# чем число строк; число запросов превышать нельзя совсем.
+LATENCY_TOLERANCE: float = 0.25
+ROWS_TOLERANCE: float = 0.1
+# Кеши, которые можно очищать между замерами: locmem принадлежит
+# только процессу замера, в dummy нечего очищать. Файловый кеш
+# и memcached могут быть общими с работающим сайтом.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def get_targets():
+    """Адреса представлений на самых нагруженных объектах набора данных:
+    самая большая группа, самый активный автор, самый обсуждаемый пост
+    и лента читателя с наибольшим числом подписок."""
+    group = Group.objects.annotate(
+        size=Count('group_posts')).order_by('-size').first()
+    author = Profile.objects.select_related('user').order_by(
+        '-posts_count').first()
+    post = Post.objects.order_by('-comments_count').first()
+    reader = Profile.objects.select_related('user').order_by(
+        '-following_count').first()
+    if None in (group, author, post, reader):
+        raise BenchmarkError(
+            'Нет данных для замеров: сначала выполните manage.py seed.')
+    return (
+        ('index', reverse('posts:index'), None),
+        ('group_posts', reverse('posts:group_list', args=[group.slug]), None),
+        ('profile', reverse('posts:profile', args=[author.user.username]),
+         None),
+        ('post_detail', reverse('posts:post_detail', args=[post.pk]), None),
+        ('follow_index', reverse('posts:follow_index'), reader.user),
+    )
+
+
+def check_cache():
+    """Замер без кеша очищает кеш перед каждым запросом; общий кеш
+    очищать нельзя, поэтому такой замер выполняется только
+    с локальным профилем."""
+    backend = settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND']
+    if backend not in LOCAL_CACHE_BACKENDS:
+        raise BenchmarkError(
+            f'Замер без кеша очистил бы общий кеш {backend}: запустите '
+            'его с CACHE_PROFILE=locmem или используйте --warm.')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[round(fraction * (len(values) - 1))]
+
+
+def measure(url, user=None, iterations=ITERATIONS, warm=False):
+    """Замер одного адреса через тестовый клиент.
+
+    Без warm кеш очищается перед каждым запросом, и замеряется
+    полный путь: запросы к базе и рендеринг шаблонов.
+    """
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    for _ in range(WARMUP):
+        client.get(url)
+    latencies, samples = [], []
+    for _ in range(iterations):
+        if not warm:
+            cache.clear()
+        with collect() as metrics:
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise BenchmarkError(f'{url}: статус {response.status_code}')
+        samples.append(metrics)
+    return {
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'queries': max(metrics.queries for metrics in samples),
+        'rows': max(metrics.rows for metrics in samples),
+        'template_ms': round(statistics.median(
+            metrics.template_time for metrics in samples) * 1000, 3),
+    }
+
+
+def run(iterations=ITERATIONS, warm=False):
+    if not warm:
+        check_cache()
+    return {
+        name: measure(url, user, iterations, warm)
+        for name, url, user in get_targets()
+    }
+
+
+def compare(results, baseline, latency_tolerance=LATENCY_TOLERANCE):
+    """Превышения бюджетов базового замера в виде списка строк."""
+    violations = []
+    for name, result in results.items():
+        budget = baseline.get(name)
+        if budget is None:
+            continue
+        limits = (
+            ('queries', budget['queries']),
+            ('rows', budget['rows'] * (1 + ROWS_TOLERANCE)),
+            ('p95_ms', budget['p95_ms'] * (1 + latency_tolerance)),
+        )
+        for metric, limit in limits:
+            if result[metric] > limit:
+                violations.append(
+                    f'{name}: {metric} {result[metric]} > {limit:g}')
+    return violations
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w', encoding='utf-8') as baseline:
+        json.dump(results, baseline, indent=2, sort_keys=True)
+        baseline.write('\n')
@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+import threading
+import time
+
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts import writebehind
+from posts.models import Comment, Post, User
+
+from .runner import BenchmarkError, percentile
+
+BURST_WRITES: int = 1000
+# Частота отправки комментариев в секунду.
+BURST_RATE: int = 1000
+BURST_THREADS: int = 16
+BURST_POSTS: int = 20
+
+
+def get_burst_targets(threads=BURST_THREADS, posts=BURST_POSTS):
+    """Авторизованные клиенты, по одному на поток, и адреса
+    добавления комментария к самым обсуждаемым постам."""
+    users = list(User.objects.order_by('pk')[:threads])
+    post_ids = list(Post.objects.order_by('-comments_count').values_list(
+        'pk', flat=True)[:posts])
+    if not users or not post_ids:
+        raise BenchmarkError(
+            'Нет данных для замеров: сначала выполните manage.py seed.')
+    clients = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+    urls = [reverse('posts:add_comment', args=[pk]) for pk in post_ids]
+    return clients, urls
+
+
+def burst(clients, urls, writes=BURST_WRITES, rate=BURST_RATE):
+    """Отправка writes комментариев с частотой rate в секунду.
+
+    Запрос i запланирован на момент i / rate от начала, задержка
+    считается от этого момента: ожидание свободного потока при
+    отставании от графика тоже в нее входит.
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def worker(number, client):
+        try:
+            for index in range(number, writes, len(clients)):
+                scheduled = started + index / rate
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                try:
+                    response = client.post(
+                        urls[index % len(urls)],
+                        {'text': f'Комментарий нагрузочного замера {index}'})
+                    error = (None if response.status_code == 302
+                             else f'статус {response.status_code}')
+                except Exception as exception:
+                    error = repr(exception)
+                with lock:
+                    if error is None:
+                        latencies.append(time.perf_counter() - scheduled)
+                    else:
+                        errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(number, client))
+               for number, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        raise BenchmarkError(f'Все запросы завершились ошибкой: {errors[0]}')
+    return {
+        'writes': len(latencies),
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def run(writes=BURST_WRITES, rate=BURST_RATE, threads=BURST_THREADS,
+        keep=False):
+    """Один и тот же всплеск записей в обычном режиме и в режиме
+    отложенной записи; для второго отдельно замеряется разбор
+    очереди. Созданные комментарии удаляются, если не задан keep."""
+    clients, urls = get_burst_targets(threads)
+    last_pk = Comment.objects.aggregate(last=Max('pk'))['last'] or 0
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        with override_settings(WRITE_BEHIND=False):
+            results['direct'] = burst(clients, urls, writes, rate)
+        with override_settings(WRITE_BEHIND=True,
+                               WRITE_BEHIND_DIR=directory):
+            result = burst(clients, urls, writes, rate)
+            started = time.perf_counter()
+            writebehind.flush()
+            result['flush_seconds'] = round(
+                time.perf_counter() - started, 3)
+            results['write_behind'] = result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        if not keep:
+            Comment.objects.filter(pk__gt=last_pk).delete()
+    return results
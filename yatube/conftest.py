@@ -0,0 +1,11 @@
+import pytest
+from django.test import override_settings
+
+
+@pytest.fixture(autouse=True, scope='session')
+def eager_tasks():
+    """Фоновые задачи в тестах выполняются сразу, в том числе
+    в setUpClass: TestCase не вызывает обработчики
+    transaction.on_commit."""
+    with override_settings(TASKS_EAGER=True):
+        yield
@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'key',
+        'status',
+        'attempts',
+        'run_after',
+        'created'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('key',)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Настройка нового соединения SQLite прагмами из SQLITE_PRAGMAS.
+
+    WAL позволяет читать во время записи, synchronous=NORMAL
+    в режиме WAL убирает fsync на каждой транзакции, busy_timeout
+    заставляет писателя ждать блокировку вместо ошибки
+    "database is locked". Прагмы выполняются напрямую в драйвере,
+    минуя обертки курсоров Django.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
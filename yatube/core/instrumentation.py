@@ -0,0 +1,227 @@
+import heapq
+import os
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from django.template.base import Template
+
+# Сколько самых медленных запросов запоминает замер.
+SLOW_QUERIES: int = 5
+SQL_MAX_LENGTH: int = 300
+
+_local = threading.local()
+_installed = False
+_missing = object()
+
+
+class Metrics:
+    """Счетчики одного замера: запросы и время в базе, прочитанные
+    строки, время рендеринга шаблонов и обращения к кешу.
+    Время хранится в секундах."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.template_time = 0.0
+        self.templates = {}
+        self.slow_queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._template_depth = 0
+
+    def add_query(self, sql, elapsed):
+        """Учет запроса; источник ищется только для медленных,
+        чтобы не разбирать стек на каждом запросе."""
+        self.queries += 1
+        self.db_time += elapsed
+        if len(self.slow_queries) < SLOW_QUERIES:
+            heapq.heappush(self.slow_queries,
+                           (elapsed, self.queries, sql, get_origin()))
+        elif elapsed > self.slow_queries[0][0]:
+            heapq.heapreplace(self.slow_queries,
+                              (elapsed, self.queries, sql, get_origin()))
+
+    def add_template(self, name, elapsed):
+        count, total = self.templates.get(name, (0, 0.0))
+        self.templates[name] = (count + 1, total + elapsed)
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'rows': self.rows,
+            'template_ms': round(self.template_time * 1000, 3),
+            'templates': {
+                name: {'count': count, 'ms': round(total * 1000, 3)}
+                for name, (count, total) in sorted(
+                    self.templates.items(), key=lambda item: -item[1][1])
+            },
+            'slow_queries': [
+                {'ms': round(elapsed * 1000, 3),
+                 'sql': str(sql)[:SQL_MAX_LENGTH],
+                 'origin': origin}
+                for elapsed, _, sql, origin in sorted(
+                    self.slow_queries, key=lambda query: -query[0])
+            ],
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def get_active():
+    """Замеры, активные в текущем потоке; вложенные замеры
+    учитывают одни и те же события."""
+    return getattr(_local, 'stack', [])
+
+
+def get_origin():
+    """Ближайшая к запросу строка кода проекта (не Django и не
+    сторонних пакетов) в виде 'путь:строка функция'."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(settings.BASE_DIR)
+                and filename != __file__
+                and 'site-packages' not in filename):
+            return '{}:{} {}'.format(
+                os.path.relpath(filename, settings.BASE_DIR),
+                frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+def _count_rows(name, many):
+    def fetch(self, *args):
+        result = getattr(self.cursor, name)(*args)
+        if result:
+            for metrics in get_active():
+                metrics.rows += len(result) if many else 1
+        return result
+    return fetch
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        active = get_active()
+        if not active:
+            return render(self, context)
+        # В template_time вложенные шаблоны (include) входят во время
+        # внешнего, в templates время каждого шаблона учтено отдельно.
+        active = list(active)
+        for metrics in active:
+            metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            name = self.origin.template_name or self.name or '<string>'
+            for metrics in active:
+                metrics._template_depth -= 1
+                metrics.add_template(name, elapsed)
+                if not metrics._template_depth:
+                    metrics.template_time += elapsed
+    return wrapper
+
+
+def _count_cache(hits, misses):
+    for metrics in get_active():
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+@contextmanager
+def _cache_call():
+    """Учитывается только внешний вызов: get_many в BaseCache
+    сам вызывает get для каждого ключа."""
+    depth = getattr(_local, 'cache_depth', 0)
+    _local.cache_depth = depth + 1
+    try:
+        yield not depth
+    finally:
+        _local.cache_depth = depth
+
+
+def _cache_get(get):
+    def wrapper(self, key, default=None, version=None):
+        with _cache_call() as outer:
+            value = get(self, key, _missing, version)
+        if outer and get_active():
+            hit = value is not _missing
+            _count_cache(int(hit), int(not hit))
+        return default if value is _missing else value
+    return wrapper
+
+
+def _cache_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        keys = list(keys)
+        with _cache_call() as outer:
+            values = get_many(self, keys, version)
+        if outer and get_active():
+            _count_cache(len(values), len(keys) - len(values))
+        return values
+    return wrapper
+
+
+def install():
+    """Однократная установка перехватчиков чтения строк, рендеринга
+    и обращений к кешу.
+
+    Вне активного замера перехватчики только проверяют
+    thread-local и ничего не считают.
+    """
+    global _installed
+    if _installed:
+        return
+    CursorWrapper.fetchone = _count_rows('fetchone', many=False)
+    CursorWrapper.fetchmany = _count_rows('fetchmany', many=True)
+    CursorWrapper.fetchall = _count_rows('fetchall', many=True)
+    Template.render = _timed_render(Template.render)
+    backends = {type(caches[alias]) for alias in settings.CACHES}
+    for backend in backends:
+        backend.get = _cache_get(backend.get)
+        backend.get_many = _cache_get_many(backend.get_many)
+    _installed = True
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for metrics in get_active():
+            metrics.add_query(sql, elapsed)
+
+
+@contextmanager
+def collect():
+    """Сбор метрик кода внутри блока в текущем потоке.
+
+    Пример:
+        with collect() as metrics:
+            client.get(url)
+        metrics.queries
+    """
+    install()
+    metrics = Metrics()
+    stack = _local.__dict__.setdefault('stack', [])
+    outermost = not stack
+    stack.append(metrics)
+    try:
+        with ExitStack() as wrappers:
+            if outermost:
+                for connection in connections.all():
+                    wrappers.enter_context(
+                        connection.execute_wrapper(_execute_wrapper))
+            yield metrics
+    finally:
+        stack.remove(metrics)
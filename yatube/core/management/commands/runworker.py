@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди: повторы после ошибок '
+            'и задачи, которые не успел выполнить пул веб-процесса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=tasks.WORKERS,
+            help='Количество потоков выполнения.')
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Максимум задач за один проход.')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, опрашивая очередь.')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза между опросами очереди в секундах.')
+
+    def handle(self, *args, **options):
+        while True:
+            done = tasks.drain(options['limit'], options['workers'])
+            if done:
+                self.stdout.write(f'Выполнено задач: {done}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,145 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import routers
+from .instrumentation import collect
+from .queries import (DUPLICATE_THRESHOLD, SLOW_QUERY_MS,
+                      DuplicateQueriesError, inspect_queries)
+
+logger = logging.getLogger('yatube.profiling')
+queries_logger = logging.getLogger('yatube.queries')
+
+# Сколько шаблонов попадает в заголовок Server-Timing.
+SERVER_TIMING_TEMPLATES: int = 5
+
+
+class ProfilingMiddleware:
+    """Профилирование выборки запросов.
+
+    Включается настройкой PROFILING_SAMPLE_RATE - долей запросов
+    от 0 до 1; при нуле middleware отключается при старте.
+    Для каждого попавшего в выборку запроса в лог yatube.profiling
+    пишется JSON с запросами к базе (самые медленные - с местом вызова),
+    временем шаблонов по отдельности и попаданиями в кеш.
+    При PROFILING_SERVER_TIMING сводка отдается и в заголовке
+    Server-Timing, который показывают инструменты разработчика браузера.
+    Middleware должен стоять первым в MIDDLEWARE, чтобы учесть
+    обращения к кешу и базе остальных middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        self.server_timing = getattr(
+            settings, 'PROFILING_SERVER_TIMING', False)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with collect() as metrics:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'total_ms': round(elapsed * 1000, 3),
+            **metrics.as_dict(),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False))
+        if self.server_timing:
+            response['Server-Timing'] = self.get_server_timing(record)
+        return response
+
+    def get_server_timing(self, record):
+        metrics = [
+            'db;dur={};desc="{} queries, {} rows"'.format(
+                record['db_ms'], record['queries'], record['rows']),
+            'tpl;dur={}'.format(record['template_ms']),
+            'cache;desc="{} hits, {} misses"'.format(
+                record['cache_hits'], record['cache_misses']),
+        ]
+        templates = list(record['templates'].items())
+        for index, (name, template) in enumerate(
+                templates[:SERVER_TIMING_TEMPLATES]):
+            metrics.append('tpl{};dur={};desc="{} x{}"'.format(
+                index, template['ms'], name, template['count']))
+        metrics.append('total;dur={}'.format(record['total_ms']))
+        return ', '.join(metrics)
+
+
+class QueryInspectorMiddleware:
+    """Поиск повторяющихся (N+1) и медленных запросов к базе.
+
+    Режим задается настройкой QUERY_INSPECTOR и проверяется
+    на каждом запросе:
+    - '' - выключено;
+    - 'log' - события пишутся в лог yatube.queries;
+    - 'raise' - повторяющиеся запросы вызывают DuplicateQueriesError
+      (используется в тестах).
+    Пороги: QUERY_DUPLICATE_THRESHOLD и QUERY_SLOW_MS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'QUERY_INSPECTOR', '')
+        if not mode:
+            return self.get_response(request)
+        with inspect_queries(
+            duplicate_threshold=getattr(
+                settings, 'QUERY_DUPLICATE_THRESHOLD', DUPLICATE_THRESHOLD),
+            slow_ms=getattr(settings, 'QUERY_SLOW_MS', SLOW_QUERY_MS),
+        ) as inspector:
+            response = self.get_response(request)
+        duplicates = inspector.duplicates()
+        if duplicates and mode == 'raise':
+            raise DuplicateQueriesError(request.path, duplicates)
+        for key, count in duplicates.items():
+            queries_logger.warning(json.dumps({
+                'event': 'duplicate_queries',
+                'path': request.path,
+                'count': count,
+                'fingerprint': key,
+            }, ensure_ascii=False))
+        for key, elapsed_ms in inspector.slow:
+            queries_logger.warning(json.dumps({
+                'event': 'slow_query',
+                'path': request.path,
+                'ms': elapsed_ms,
+                'fingerprint': key,
+            }, ensure_ascii=False))
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Закрепление пользователя за основной базой после записи.
+
+    Ответ на изменяющий запрос (POST и т.п.) ставит cookie
+    на routers.PIN_SECONDS: пока она жива, read_replica читает
+    из основной базы и отставание реплики не прячет изменения
+    от их автора. Без REPLICA_DATABASES ничего не делает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (routers.get_replicas()
+                and request.method not in routers.SAFE_METHODS
+                and response.status_code < 400):
+            response.set_cookie(
+                routers.PIN_COOKIE, '1', max_age=routers.PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+                ('name', models.CharField(max_length=200, verbose_name='Задача')),
+                ('args', models.TextField(default='[]', verbose_name='Аргументы')),
+                ('key', models.CharField(blank=True, max_length=200, null=True, verbose_name='Ключ идемпотентности')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Выполняется'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Выполнить после')),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+            ],
+            options={
+                'ordering': ('-created',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'run_after'], name='task_status_run_after'),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(status='pending'), fields=('key',), name='task_unique_pending_key'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -11,3 +12,44 @@ class CreatedModel(models.Model):
     class Meta:
         abstract = True
         ordering = ('-created',)
+
+
+class Task(CreatedModel):
+    """Фоновая задача: имя зарегистрированной функции и ее аргументы.
+
+    Ключ идемпотентности не дает поставить в очередь вторую
+    такую же задачу, пока первая еще ждет выполнения.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    args = models.TextField('Аргументы', default='[]')
+    key = models.CharField(
+        'Ключ идемпотентности', max_length=200, null=True, blank=True)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    run_after = models.DateTimeField('Выполнить после', default=timezone.now)
+    updated = models.DateTimeField('Дата изменения', default=timezone.now)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta(CreatedModel.Meta):
+        indexes = (
+            models.Index(
+                fields=('status', 'run_after'), name='task_status_run_after'),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('key',), condition=models.Q(status='pending'),
+                name='task_unique_pending_key'),
+        )
+
+    def __str__(self):
+        return f'{self.name}: {self.status}'
@@ -0,0 +1,102 @@
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# Сколько структурно одинаковых запросов за один запрос к сайту
+# считается признаком N+1.
+DUPLICATE_THRESHOLD: int = 3
+SLOW_QUERY_MS: float = 100
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?')
+IN_LIST = re.compile(r'\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+def fingerprint(sql):
+    """Нормализованный SQL: значения, параметры и списки IN
+    заменены, поэтому запросы, отличающиеся только значениями,
+    получают одинаковый отпечаток."""
+    sql = STRING.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryInspector:
+    """execute_wrapper, группирующий запросы по отпечаткам.
+
+    Находит повторяющиеся запросы (N+1) и запросы
+    дольше slow_ms миллисекунд.
+    """
+
+    def __init__(self, duplicate_threshold=DUPLICATE_THRESHOLD,
+                 slow_ms=SLOW_QUERY_MS):
+        self.duplicate_threshold = duplicate_threshold
+        self.slow_ms = slow_ms
+        self.counts = defaultdict(int)
+        self.examples = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'ignored', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            key = fingerprint(sql)
+            self.counts[key] += 1
+            self.examples.setdefault(key, sql)
+            if elapsed_ms >= self.slow_ms:
+                self.slow.append((key, round(elapsed_ms, 3)))
+
+    def duplicates(self):
+        """Отпечатки, повторившиеся не меньше duplicate_threshold раз,
+        с числом повторов."""
+        return {
+            key: count for key, count in self.counts.items()
+            if count >= self.duplicate_threshold
+        }
+
+
+class DuplicateQueriesError(AssertionError):
+    """Обнаружен шаблон N+1 - повтор одинаковых запросов."""
+
+    def __init__(self, path, duplicates):
+        lines = [f'{count} x {key}' for key, count in duplicates.items()]
+        super().__init__(
+            f'Повторяющиеся запросы при обработке {path}:\n'
+            + '\n'.join(lines))
+        self.duplicates = duplicates
+
+
+@contextmanager
+def ignore_queries():
+    """Запросы внутри блока не учитываются инспектором
+    в текущем потоке."""
+    ignored = getattr(_local, 'ignored', False)
+    _local.ignored = True
+    try:
+        yield
+    finally:
+        _local.ignored = ignored
+
+
+@contextmanager
+def inspect_queries(**options):
+    """Подключение QueryInspector ко всем соединениям на время блока."""
+    inspector = QueryInspector(**options)
+    with ExitStack() as wrappers:
+        for connection in connections.all():
+            wrappers.enter_context(connection.execute_wrapper(inspector))
+        yield inspector
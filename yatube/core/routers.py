@@ -0,0 +1,84 @@
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Cookie, закрепляющая чтения пользователя за основной базой после
+# записи, чтобы он сразу видел свои изменения (read-your-writes).
+PIN_COOKIE: str = 'primary_pin'
+PIN_SECONDS: int = 10
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_state = threading.local()
+
+
+def get_replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def get_replica():
+    """Реплика, выбранная для текущего блока use_replica, или None."""
+    return getattr(_state, 'replica', None)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Чтения внутри блока в текущем потоке идут в реплику.
+
+    Реплика выбирается один раз на блок (вложенный блок наследует
+    выбор внешнего): все запросы одного ответа видят одно состояние
+    базы, а не данные реплик с разным отставанием.
+    """
+    previous = get_replica()
+    replicas = get_replicas()
+    if not enabled or not replicas:
+        _state.replica = None
+    else:
+        _state.replica = previous or random.choice(replicas)
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def read_replica(view):
+    """Декоратор представления, которое только читает данные.
+
+    Чтения уходят в реплику, если пользователь недавно ничего
+    не записывал; записи в любом случае идут в основную базу.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica(not is_pinned(request)):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Маршрутизация чтений в реплики из REPLICA_DATABASES.
+
+    Реплики используются только внутри use_replica (read_replica),
+    остальные чтения и все записи идут в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Явный ответ нужен, иначе объект, прочитанный из реплики,
+        # сохранялся бы в нее же.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        """Реплики получают схему репликацией из основной базы."""
+        return db not in get_replicas()
@@ -0,0 +1,177 @@
+import json
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+from .queries import ignore_queries
+
+logger = logging.getLogger(__name__)
+
+WORKERS: int = 4
+MAX_ATTEMPTS: int = 5
+# Пауза перед повтором: BACKOFF_BASE * 2 ** (попытка - 1) секунд
+# со случайным разбросом, но не больше BACKOFF_MAX.
+BACKOFF_BASE: float = 2.0
+BACKOFF_MAX: float = 60.0 * 10
+# Задача, которая выполняется дольше, считается брошенной
+# упавшим воркером и возвращается в очередь.
+STALE_AFTER: int = 60 * 10
+
+_registry = {}
+_executor = None
+
+
+def task(key=None, max_attempts=MAX_ATTEMPTS):
+    """Регистрация функции как фоновой задачи.
+
+    key - шаблон ключа идемпотентности, подставляются аргументы:
+    key='index_post:{0}'. У функции появляется метод delay(*args),
+    который ставит задачу в очередь. Аргументы должны
+    сериализоваться в JSON.
+    """
+    def decorator(function):
+        function.task_name = f'{function.__module__}.{function.__name__}'
+        function.task_key = key
+        function.max_attempts = max_attempts
+        function.delay = lambda *args: enqueue(function, *args)
+        _registry[function.task_name] = function
+        return function
+    return decorator
+
+
+def get_executor():
+    """Пул потоков процесса для задач, запущенных после коммита."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=WORKERS, thread_name_prefix='tasks')
+    return _executor
+
+
+def is_eager():
+    return getattr(settings, 'TASKS_EAGER', False)
+
+
+def enqueue(function, *args):
+    """Постановка задачи в очередь в текущей транзакции.
+
+    Строка задачи пишется вместе с изменениями, которые ее вызвали,
+    а выполнение в пуле потоков начинается после коммита. Если задача
+    с тем же ключом уже ждет выполнения, новая не создается.
+    В режиме TASKS_EAGER задача выполняется сразу; ее запросы
+    не учитываются инспектором запросов, так как в рабочем режиме
+    они выполняются вне запроса к сайту.
+    """
+    if is_eager():
+        with ignore_queries():
+            function(*args)
+        return None
+    key = function.task_key.format(*args) if function.task_key else None
+    try:
+        with transaction.atomic():
+            job = Task.objects.create(
+                name=function.task_name, args=json.dumps(args), key=key)
+    except IntegrityError:
+        return None
+    transaction.on_commit(lambda: get_executor().submit(run_task, job.pk))
+    return job
+
+
+def get_backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def fail(job, function, error):
+    """Повтор задачи с экспоненциальной паузой или отметка об ошибке
+    после max_attempts попыток."""
+    max_attempts = getattr(function, 'max_attempts', 0)
+    if job.attempts >= max_attempts:
+        Task.objects.filter(pk=job.pk).update(
+            status=Task.FAILED, error=error, updated=timezone.now())
+        return
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=job.pk).update(
+                status=Task.PENDING, error=error, updated=now,
+                run_after=now + get_backoff(job.attempts))
+    except IntegrityError:
+        # Пока задача выполнялась, в очередь встала такая же:
+        # повтор не нужен, работу сделает она.
+        Task.objects.filter(pk=job.pk).delete()
+
+
+def process_task(task_id):
+    """Выполнение одной задачи; возвращает True при успехе.
+
+    Задача захватывается условным UPDATE, поэтому одну и ту же
+    задачу не выполнят одновременно пул процесса и воркер.
+    Выполненная задача удаляется, задачи с ошибкой остаются
+    в таблице для разбора.
+    """
+    claimed = Task.objects.filter(
+        pk=task_id, status=Task.PENDING, run_after__lte=timezone.now()
+    ).update(status=Task.PROCESSING, attempts=F('attempts') + 1,
+             updated=timezone.now())
+    if not claimed:
+        return False
+    job = Task.objects.get(pk=task_id)
+    function = _registry.get(job.name)
+    try:
+        if function is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована')
+        function(*json.loads(job.args))
+    except Exception as error:
+        logger.exception('Задача %s (%s) завершилась ошибкой',
+                         job.name, job.pk)
+        fail(job, function, repr(error))
+        return False
+    Task.objects.filter(pk=task_id).delete()
+    return True
+
+
+def run_task(task_id):
+    """Обертка для выполнения задачи в отдельном потоке."""
+    try:
+        return process_task(task_id)
+    finally:
+        connection.close()
+
+
+def requeue_stale():
+    """Возврат в очередь задач, брошенных упавшим воркером.
+    Задачи, у которых в очереди уже есть двойник, удаляются."""
+    stale = Task.objects.filter(
+        status=Task.PROCESSING,
+        updated__lt=timezone.now() - timedelta(seconds=STALE_AFTER),
+    )
+    stale.filter(key__in=Task.objects.filter(
+        status=Task.PENDING, key__isnull=False).values('key')).delete()
+    return stale.update(status=Task.PENDING, updated=timezone.now())
+
+
+def drain(limit=None, workers=WORKERS):
+    """Выполнение накопившихся задач пулом потоков,
+    при workers=1 - в текущем потоке.
+
+    Возвращает количество успешно выполненных задач.
+    """
+    requeue_stale()
+    tasks = Task.objects.filter(
+        status=Task.PENDING, run_after__lte=timezone.now()
+    ).order_by('run_after')
+    task_ids = list(tasks.values_list('pk', flat=True)[:limit])
+    if not task_ids:
+        return 0
+    if workers == 1:
+        return sum(map(process_task, task_ids))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(run_task, task_ids))
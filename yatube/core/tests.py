@@ -1,6 +1,34 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
 from http import HTTPStatus
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.utils import timezone
+
+from posts.models import Group
+
+from . import routers, tasks
+from .instrumentation import collect
+from .middleware import QueryInspectorMiddleware, ReplicaPinMiddleware
+from .models import Task
+from .queries import DuplicateQueriesError, fingerprint, inspect_queries
+
+User = get_user_model()
+calls = []
+
+
+@tasks.task(key='record:{0}', max_attempts=2)
+def record(value):
+    if value == 'fail':
+        raise ValueError(value)
+    calls.append(value)
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +36,258 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class InstrumentationTest(TestCase):
+    def test_collect_counts_queries_and_rows(self):
+        """Замер считает запросы и прочитанные строки."""
+        User.objects.create_user(username='first')
+        User.objects.create_user(username='second')
+        with collect() as metrics:
+            list(User.objects.all())
+            User.objects.filter(username='first').exists()
+        self.assertEqual(metrics.queries, 2)
+        self.assertEqual(metrics.rows, 3)
+
+    def test_nested_collect(self):
+        """Вложенный замер не удваивает счетчики внешнего."""
+        with collect() as outer:
+            with collect() as inner:
+                User.objects.count()
+        self.assertEqual(outer.queries, 1)
+        self.assertEqual(inner.queries, 1)
+
+    def test_collect_measures_templates(self):
+        """Время рендеринга учитывается только внутри замера."""
+        with collect() as metrics:
+            self.client.get('/nonexist-page/')
+        self.assertGreater(metrics.template_time, 0)
+        self.assertEqual(metrics._template_depth, 0)
+
+    def test_collect_counts_cache_hits(self):
+        """Замер считает попадания и промахи кеша."""
+        cache.set('instrumentation-key', 1)
+        with collect() as metrics:
+            cache.get('instrumentation-key')
+            cache.get('missing-key')
+            cache.get_many(['instrumentation-key', 'missing-key'])
+        self.assertEqual(metrics.cache_hits, 2)
+        self.assertEqual(metrics.cache_misses, 2)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_SERVER_TIMING=True)
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_profiled_request(self):
+        """Запрос из выборки попадает в лог и в заголовок Server-Timing."""
+        with self.assertLogs('yatube.profiling', 'INFO') as logs:
+            response = self.client.get('/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertGreater(record['queries'], 0)
+        self.assertIn('posts/index.html', record['templates'])
+        self.assertIn('posts/includes/paginator.html', record['templates'])
+        self.assertTrue(record['slow_queries'][0]['origin'])
+        self.assertGreater(record['cache_misses'], 0)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        """При нулевой доле выборки middleware не используется."""
+        response = self.client.get('/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class QueryInspectorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for i in range(3):
+            User.objects.create_user(username=f'user{i}')
+
+    def load_one_by_one(self, request=None):
+        for pk in User.objects.values_list('pk', flat=True):
+            User.objects.get(pk=pk)
+        return HttpResponse()
+
+    def test_fingerprint(self):
+        """Запросы, различающиеся значениями, дают один отпечаток."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 1 AND name = 'a'"),
+            fingerprint("SELECT * FROM t WHERE id = 25 AND name = 'b''c'"))
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            'SELECT * FROM t WHERE id IN (...)')
+
+    def test_duplicates(self):
+        """Повторы одного запроса находятся, одиночные запросы - нет."""
+        with inspect_queries() as inspector:
+            self.load_one_by_one()
+        self.assertEqual(list(inspector.duplicates().values()), [3])
+
+    @override_settings(QUERY_INSPECTOR='raise')
+    def test_middleware_raises(self):
+        """В режиме raise шаблон N+1 вызывает ошибку."""
+        middleware = QueryInspectorMiddleware(self.load_one_by_one)
+        with self.assertRaises(DuplicateQueriesError):
+            middleware(RequestFactory().get('/'))
+
+    @override_settings(QUERY_INSPECTOR='log', QUERY_SLOW_MS=0)
+    def test_middleware_logs(self):
+        """В режиме log пишутся события о повторах и медленных запросах."""
+        middleware = QueryInspectorMiddleware(self.load_one_by_one)
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        events = [json.loads(record.getMessage())['event']
+                  for record in logs.records]
+        self.assertIn('duplicate_queries', events)
+        self.assertIn('slow_query', events)
+
+
+class SqlitePragmasTest(TestCase):
+    def test_file_database_pragmas(self):
+        """Новое соединение с файлом SQLite получает прагмы из настроек."""
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            self.skipTest('Проверяются только соединения SQLite.')
+        path = os.path.join(tempfile.mkdtemp(), 'pragmas.sqlite3')
+        wrapper = type(connection)(
+            {**connection.settings_dict, 'NAME': path}, alias='pragmas')
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 5000)
+        finally:
+            wrapper.close()
+
+
+class ReplicaRoutingTest(SimpleTestCase):
+    """Реплика - отдельный файл SQLite со своими данными; запросы
+    к основной базе в SimpleTestCase запрещены, поэтому неверная
+    маршрутизация чтения завершится ошибкой."""
+
+    ALIAS = 'replica_test'
+
+    def setUp(self):
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            self.skipTest('Проверяется на файлах SQLite.')
+        connections.databases[self.ALIAS] = {
+            **connection.settings_dict,
+            'NAME': os.path.join(tempfile.mkdtemp(), 'replica.sqlite3'),
+        }
+        self.addCleanup(self.remove_replica)
+        with connections[self.ALIAS].schema_editor() as editor:
+            editor.create_model(Group)
+        Group.objects.using(self.ALIAS).create(
+            title='Группа реплики', slug='replica-only', description='')
+
+    def remove_replica(self):
+        connections[self.ALIAS].close()
+        del connections[self.ALIAS]
+        del connections.databases[self.ALIAS]
+
+    @override_settings(REPLICA_DATABASES=[ALIAS])
+    def test_reads_go_to_replica(self):
+        """Внутри read_replica чтения идут в файл реплики."""
+        view = routers.read_replica(lambda request: Group.objects.filter(
+            slug='replica-only').exists())
+        self.assertTrue(view(RequestFactory().get('/')))
+
+    @override_settings(REPLICA_DATABASES=[ALIAS])
+    def test_pinned_and_writes_use_primary(self):
+        """Закрепленный пользователь и записи используют основную базу."""
+        router = routers.ReplicaRouter()
+        request = RequestFactory().get('/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        view = routers.read_replica(
+            lambda request: router.db_for_read(Group))
+        self.assertEqual(view(request), 'default')
+        with routers.use_replica():
+            self.assertEqual(router.db_for_read(Group), self.ALIAS)
+            self.assertEqual(router.db_for_write(Group), 'default')
+        self.assertFalse(router.allow_migrate(self.ALIAS, 'posts'))
+
+    @override_settings(REPLICA_DATABASES=[ALIAS, 'other_replica'])
+    def test_replica_chosen_once_per_block(self):
+        """Все чтения блока и вложенных блоков идут в одну реплику."""
+        router = routers.ReplicaRouter()
+        with routers.use_replica():
+            chosen = router.db_for_read(Group)
+            with routers.use_replica():
+                self.assertEqual(
+                    {router.db_for_read(Group) for _ in range(20)}, {chosen})
+            with routers.use_replica(False):
+                self.assertEqual(router.db_for_read(Group), 'default')
+            self.assertEqual(router.db_for_read(Group), chosen)
+        self.assertEqual(router.db_for_read(Group), 'default')
+
+    @override_settings(REPLICA_DATABASES=[ALIAS])
+    def test_pin_cookie_after_write(self):
+        """Изменяющий запрос ставит cookie закрепления, чтение - нет."""
+        middleware = ReplicaPinMiddleware(lambda request: HttpResponse())
+        factory = RequestFactory()
+        self.assertIn(routers.PIN_COOKIE,
+                      middleware(factory.post('/')).cookies)
+        self.assertNotIn(routers.PIN_COOKIE,
+                         middleware(factory.get('/')).cookies)
+
+
+@override_settings(TASKS_EAGER=False)
+class TasksTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_deduplicates_by_key(self):
+        """Пока задача ждет выполнения, такая же не ставится,
+        выполненная задача удаляется из очереди."""
+        job = record.delay('a')
+        self.assertIsNone(record.delay('a'))
+        record.delay('b')
+        self.assertEqual(Task.objects.filter(status=Task.PENDING).count(), 2)
+        self.assertTrue(tasks.process_task(job.pk))
+        self.assertFalse(tasks.process_task(job.pk))
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(tasks.drain(workers=1), 1)
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_retry_with_backoff(self):
+        """Ошибка откладывает повтор, после max_attempts задача
+        отмечается как неудачная."""
+        job = record.delay('fail')
+        self.assertFalse(tasks.process_task(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('ValueError', job.error)
+        self.assertEqual(tasks.drain(workers=1), 0)
+        Task.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertFalse(tasks.process_task(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.FAILED)
+
+    def test_requeue_stale(self):
+        """Задача, брошенная упавшим воркером, возвращается в очередь."""
+        job = record.delay('a')
+        Task.objects.filter(pk=job.pk).update(
+            status=Task.PROCESSING,
+            updated=timezone.now() - timedelta(seconds=tasks.STALE_AFTER + 1))
+        self.assertEqual(tasks.drain(workers=1), 1)
+        self.assertEqual(calls, ['a'])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager(self):
+        """В режиме TASKS_EAGER задача выполняется сразу."""
+        self.assertIsNone(record.delay('a'))
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(Task.objects.exists())
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -18,6 +19,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE."""
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search.search_posts(search_term)), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -36,6 +43,12 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('created',)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            pk__in=search.search_comments(search_term)), False
+
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
@@ -0,0 +1,198 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from core.routers import PIN_SECONDS, get_replica
+
+from .models import Follow, Group
+
+FEED_CACHE_TIMEOUT: int = 60 * 5
+GENERATION_TIMEOUT: int = 60 * 60 * 24
+
+INDEX_SCOPE: str = 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def generation_key(scope):
+    """Ключ поколения; slug и username хешируются,
+    чтобы ключ был допустим для memcached."""
+    return 'generation:' + hashlib.md5(scope.encode()).hexdigest()
+
+
+def get_generations(*scopes):
+    """Текущие поколения областей кеша.
+
+    Поколение - это метка времени последней записи, затронувшей область.
+    Если метки в кеше нет, область считается только что измененной.
+    """
+    keys = [generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    missing = {key: str(time.time()) for key in keys
+               if key not in generations}
+    if missing:
+        cache.set_many(missing, GENERATION_TIMEOUT)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def invalidate(*scopes):
+    """Сброс поколений: страницы этих областей перестают совпадать
+    с ключами в кеше и будут отрендерены заново."""
+    cache.delete_many([generation_key(scope) for scope in scopes])
+
+
+def is_recent(generations):
+    """Область менялась последние PIN_SECONDS секунд: реплика
+    могла еще не получить запись, и прочитанная из нее страница
+    осталась бы в кеше устаревшей на FEED_CACHE_TIMEOUT."""
+    newest = max(float(generation) for generation in generations)
+    return time.time() - newest < PIN_SECONDS
+
+
+def get_validators(request, generations):
+    """ETag и Last-Modified страницы по поколениям ее областей.
+
+    ETag включает пользователя: страницы авторизованных различаются.
+    Для авторизованных в него входит и секрет CSRF: после повторного
+    входа секрет меняется, и копия страницы с формой и старым токеном
+    не получит 304. Last-Modified - время последней записи - отдается
+    только гостям, иначе после входа браузер мог бы получить 304
+    на гостевую копию.
+    """
+    user = request.user.pk or ''
+    if request.user.is_authenticated:
+        user = '{}:{}'.format(user, request.META.get('CSRF_COOKIE', ''))
+    etag = quote_etag(hashlib.md5('{}:{}'.format(
+        user, '.'.join(generations)).encode()).hexdigest())
+    if request.user.is_authenticated:
+        return etag, None
+    return etag, int(max(float(generation) for generation in generations))
+
+
+def page_key(request, generations):
+    """Ключ отрендеренной страницы: пользователь, поколения
+    областей и адрес вместе с параметрами запроса."""
+    return 'feed:{}:{}'.format(request.user.pk or '', hashlib.md5(
+        '{}:{}'.format('.'.join(generations), request.get_full_path())
+        .encode()).hexdigest())
+
+
+def get_cached_page(request, generations, timeout, view, *args, **kwargs):
+    """Страница из кеша или отрендеренная и сохраненная в кеш.
+
+    Кеш только серверный: заголовки Cache-Control и Expires, которые
+    ставит cache_page, позволили бы браузеру показывать страницу
+    без запроса к серверу и после записи.
+    """
+    key = page_key(request, generations)
+    response = cache.get(key)
+    if response is None:
+        response = view(request, *args, **kwargs)
+        if (response.status_code == 200 and not response.streaming
+                and not response.cookies):
+            cache.set(key, response, timeout)
+    return response
+
+
+def conditional_feed(get_scopes, timeout=None):
+    """Условный GET по поколениям областей страницы.
+
+    Проверка If-None-Match/If-Modified-Since стоит одного чтения
+    из кеша и выполняется до запросов к базе и рендеринга шаблона.
+    Если задан timeout, отрендеренная страница кешируется с ключом,
+    зависящим от поколений (см. cache_feed). Страница, прочитанная
+    из реплики сразу после изменения области, в кеш не попадает.
+    Браузер перепроверяет страницу при каждом показе (no-cache),
+    поэтому запись видна сразу, а неизменившаяся страница
+    стоит ответа 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            generations = get_generations(
+                *get_scopes(request, *args, **kwargs))
+            etag, last_modified = get_validators(request, generations)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None and (timeout is None or (
+                    get_replica() and is_recent(generations))):
+                response = view(request, *args, **kwargs)
+            elif response is None:
+                response = get_cached_page(
+                    request, generations, timeout, view, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(response, private=True, no_cache=True)
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_feed(get_scopes, timeout=FEED_CACHE_TIMEOUT):
+    """Кеширование страницы с ключом, зависящим от поколений областей.
+
+    get_scopes получает аргументы представления и возвращает области,
+    от которых зависит страница. Страницы авторизованных пользователей
+    кешируются отдельно для каждого пользователя. Условный GET
+    поддерживается так же, как в conditional_feed.
+    """
+    return conditional_feed(get_scopes, timeout)
+
+
+def invalidate_followers(author_id):
+    """Сброс лент подписок всех подписчиков автора."""
+    invalidate(*(
+        follow_scope(user_id) for user_id in Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True)))
+
+
+def invalidate_post(post, group_ids=(), followers=True):
+    """Сброс кеша страниц, на которых выводится пост.
+
+    Без followers ленты подписчиков не сбрасываются: у популярного
+    автора это долгий запрос, его выполняет фоновая задача.
+    """
+    group_ids = {post.group_id, *group_ids} - {None}
+    scopes = [
+        INDEX_SCOPE,
+        author_scope(post.author.username),
+        post_scope(post.pk),
+    ]
+    scopes.extend(
+        group_scope(slug) for slug in Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True))
+    invalidate(*scopes)
+    if followers:
+        invalidate_followers(post.author_id)
+
+
+def invalidate_follow(follow):
+    """Сброс ленты подписчика и профилей обоих пользователей."""
+    invalidate(
+        follow_scope(follow.user_id),
+        author_scope(follow.user.username),
+        author_scope(follow.author.username),
+    )
@@ -0,0 +1,86 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Profile
+
+from .models import Comment, Follow, Post, User
+
+
+def increment(queryset, field, delta=1):
+    """Атомарное изменение счетчика без чтения значения в Python."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def refresh(queryset):
+    """Пересчет счетчиков выбранных строк по фактическим данным.
+
+    Подзапросы считают все строки, поэтому refresh нужен только
+    для исправления: записи меняют счетчики через increment.
+    """
+    return queryset.update(**get_actual_counters()[queryset.model])
+
+
+def get_profile(user):
+    """Профиль пользователя со счетчиками.
+
+    У пользователей, созданных до появления профилей или массовой
+    вставкой в обход сигнала, профиля нет: он создается
+    с пересчитанными счетчиками.
+    """
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        profile, created = Profile.objects.get_or_create(user=user)
+        if created:
+            refresh(Profile.objects.filter(pk=profile.pk))
+            profile.refresh_from_db()
+        user.profile = profile
+        return profile
+
+
+def count_by(queryset, field, ref):
+    """Подзапрос с количеством строк queryset для внешней строки ref."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(ref)}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def get_actual_counters():
+    """Фактические значения счетчиков, вычисленные агрегатами."""
+    return {
+        Profile: {
+            'posts_count': count_by(Post.objects, 'author', 'user'),
+            'followers_count': count_by(Follow.objects, 'author', 'user'),
+            'following_count': count_by(Follow.objects, 'user', 'user'),
+        },
+        Post: {
+            'comments_count': count_by(Comment.objects, 'post', 'pk'),
+        },
+    }
+
+
+def reconcile():
+    """Пересчет всех счетчиков одним UPDATE на каждую таблицу.
+
+    Возвращает словарь с количеством строк, в которых счетчики
+    расходились с фактическими значениями.
+    """
+    Profile.objects.bulk_create(
+        [Profile(user_id=user_id) for user_id in User.objects.filter(
+            profile__isnull=True).values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+    drift = {}
+    for model, counters in get_actual_counters().items():
+        aliases = {f'actual_{field}': value
+                   for field, value in counters.items()}
+        drift[model._meta.label] = model.objects.annotate(
+            **aliases
+        ).exclude(**{
+            field: F(f'actual_{field}') for field in counters
+        }).count()
+        model.objects.update(**counters)
+    return drift
@@ -0,0 +1,129 @@
+import csv
+import json
+import zlib
+
+from .models import Comment, Follow, Post
+
+# Строк за одно обращение к курсору базы и в одном куске вывода:
+# память не зависит от размера таблицы.
+CHUNK_SIZE: int = 2000
+NDJSON: str = 'ndjson'
+CSV: str = 'csv'
+FORMATS = (NDJSON, CSV)
+CONTENT_TYPES = {
+    NDJSON: 'application/x-ndjson',
+    CSV: 'text/csv',
+}
+
+# Наборы данных: колонка выгрузки -> выражение для values_list().
+# Авторы и группы выгружаются по username и slug, как в API.
+DATASETS = {
+    'posts': (Post, {
+        'id': 'id',
+        'text': 'text',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'created': 'created',
+        'updated': 'updated',
+        'comments_count': 'comments_count',
+        'image': 'image',
+    }),
+    'comments': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, {
+        'id': 'id',
+        'user': 'user__username',
+        'author': 'author__username',
+        'created': 'created',
+    }),
+}
+
+
+def parse_watermark(value):
+    """Отметка - неотрицательное целое. ValueError для неверной строки."""
+    if not value.isdigit():
+        raise ValueError(f'Неверная отметка: {value}')
+    return int(value)
+
+
+def get_watermark(dataset, since=None):
+    """Отметка выгрузки: наибольший id набора, но не меньше
+    отметки предыдущей выгрузки.
+
+    Отметка по id, а не по created: дату записи задает приложение
+    до фиксации транзакции, а импорт может задать ее в прошлом,
+    и такие записи оказались бы раньше уже выданной отметки.
+    Записи в SQLite фиксируются по одной, поэтому id растет
+    в порядке фиксации.
+    """
+    model, _ = DATASETS[dataset]
+    latest = model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first()
+    if latest is None or since is not None and since > latest:
+        return since
+    return latest
+
+
+def get_rows(dataset, since=None, until=None, chunk_size=CHUNK_SIZE):
+    """Строки набора с id в (since, until] по возрастанию id.
+
+    Верхняя граница фиксируется до начала выгрузки, поэтому записи,
+    добавленные во время выгрузки, попадут в следующую инкрементальную
+    выгрузку от until, а не потеряются между двумя выгрузками.
+    """
+    model, fields = DATASETS[dataset]
+    queryset = model.objects.order_by('pk')
+    if since is not None:
+        queryset = queryset.filter(pk__gt=since)
+    if until is not None:
+        queryset = queryset.filter(pk__lte=until)
+    return queryset.values_list(*fields.values()).iterator(
+        chunk_size=chunk_size)
+
+
+def to_text(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+class Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку
+    вместо записи, чтобы не копить вывод в буфере."""
+
+    def write(self, value):
+        return value
+
+
+def render(dataset, rows, file_format=NDJSON, chunk_size=CHUNK_SIZE):
+    """Текст выгрузки кусками не больше chunk_size строк."""
+    columns = list(DATASETS[dataset][1])
+    if file_format == CSV:
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        line = writer.writerow
+    else:
+        def line(row):
+            return json.dumps(
+                dict(zip(columns, row)), ensure_ascii=False) + '\n'
+    lines = []
+    for row in rows:
+        lines.append(line([to_text(value) for value in row]))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def compress(chunks):
+    """Сжатие потока в gzip без накопления его в памяти."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
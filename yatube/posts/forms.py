@@ -9,6 +9,19 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def save(self, commit=True):
+        """Существующий пост сохраняется только полями формы:
+        счетчик комментариев и флаг миниатюр меняются параллельно
+        и не перезаписываются значениями из начала запроса."""
+        post = super().save(commit=False)
+        if commit and post.pk is None:
+            post.save()
+        elif commit:
+            post.save(update_fields=(
+                *self._meta.fields, 'image_width', 'image_height',
+                'updated'))
+        return post
+
 
 class CommentForm(forms.ModelForm):
 
@@ -0,0 +1,61 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, features
+
+FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'WEBP': ('.webp', 'image/webp'),
+}
+
+
+def get_output_format():
+    """Формат хранения загрузок; без поддержки WebP в Pillow - JPEG."""
+    image_format = getattr(settings, 'POST_IMAGE_FORMAT', 'JPEG').upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format if image_format in FORMATS else 'JPEG'
+
+
+def flatten(image):
+    """Перевод в RGB с заливкой прозрачных областей белым."""
+    if image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert('RGB')
+
+
+def normalize_image(upload):
+    """Нормализация загруженного изображения.
+
+    Поворачивает снимок по EXIF, уменьшает до POST_IMAGE_MAX_SIZE
+    и перекодирует в POST_IMAGE_FORMAT с качеством POST_IMAGE_QUALITY.
+    Метаданные при перекодировании не сохраняются.
+    Возвращает новый файл.
+    """
+    upload.seek(0)
+    with Image.open(upload) as source:
+        image = flatten(ImageOps.exif_transpose(source))
+    image.thumbnail(
+        getattr(settings, 'POST_IMAGE_MAX_SIZE', (1920, 1920)),
+        Image.LANCZOS,
+    )
+    image_format = get_output_format()
+    options = {
+        'quality': getattr(settings, 'POST_IMAGE_QUALITY', 85),
+        'optimize': True,
+    }
+    if image_format == 'JPEG':
+        options['progressive'] = True
+    else:
+        options['method'] = 6
+    output = BytesIO()
+    image.save(output, image_format, **options)
+    extension, content_type = FORMATS[image_format]
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    return SimpleUploadedFile(name, output.getvalue(), content_type)
@@ -0,0 +1,306 @@
+import json
+import logging
+from collections import Counter
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.models import Profile
+
+from . import caching, search, timeline, trending
+from .counters import increment
+from .models import (Comment, Follow, Group, ImportCheckpoint, ImportedPost,
+                     Post, User)
+from .seeding import insert
+
+logger = logging.getLogger(__name__)
+
+# Строк входного файла в одной транзакции и одной отметке.
+BATCH_SIZE: int = 1000
+SOURCE_MAX_LENGTH: int = ImportedPost._meta.get_field('source').max_length
+
+GROUP: str = 'group'
+POST: str = 'post'
+COMMENT: str = 'comment'
+
+
+def parse_created(value):
+    """Дата из ISO 8601 или None для неверной или невозможной
+    даты; без даты запись получает текущее время, дата без часового
+    пояса считается в часовом поясе проекта."""
+    if value is None:
+        return timezone.now()
+    try:
+        moment = parse_datetime(str(value))
+    except ValueError:
+        return None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def validate(obj, exclude):
+    """Проверка полей модели без запросов к базе: связи уже
+    разрешены по картам, уникальность проверяется пакетом."""
+    try:
+        obj.full_clean(exclude=exclude, validate_unique=False)
+    except ValidationError as error:
+        return '; '.join(
+            f'{field}: {" ".join(messages)}'
+            for field, messages in error.message_dict.items())
+    return None
+
+
+class Importer:
+    """Импорт групп, постов и комментариев из NDJSON.
+
+    Каждая строка - объект с полем kind:
+    {"kind": "group", "slug": ..., "title": ..., "description": ...},
+    {"kind": "post", "id": ..., "author": ..., "group": ..., "text": ...,
+    "created": ...}, {"kind": "comment", "post": ..., "author": ...,
+    "text": ..., "created": ...}. Авторы и группы указываются
+    по username и slug, комментарий ссылается на id поста во входных
+    данных, поэтому пост должен идти раньше своих комментариев.
+
+    Строки обрабатываются пакетами по batch_size: поиск авторов
+    и групп - одним запросом на пакет с запоминанием в картах,
+    вставка - bulk_create в одной транзакции на пакет, счетчики
+    увеличиваются на число вставленных строк одним UPDATE на автора
+    или пост. В той же транзакции
+    отметка checkpoint (ImportCheckpoint с этим именем) получает номер
+    последней строки пакета, а соответствие id постов сохраняется
+    в ImportedPost: пакет и отметка фиксируются или откатываются вместе,
+    и повторный запуск не создает дублей.
+    """
+
+    def __init__(self, checkpoint=None, batch_size=BATCH_SIZE):
+        self.checkpoint = None
+        self.batch_size = batch_size
+        self.line = 0
+        self.users = {}
+        self.groups = {}
+        self.posts = {}
+        self.stats = Counter()
+        self.errors = []
+        if checkpoint:
+            self.checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+                name=checkpoint)
+            self.line = self.checkpoint.line
+
+    def save_checkpoint(self, line, imported):
+        if self.checkpoint is None:
+            return
+        ImportedPost.objects.bulk_create([
+            ImportedPost(checkpoint=self.checkpoint, source=source,
+                         post_id=post_id)
+            for source, post_id in imported.items()
+        ])
+        self.checkpoint.line = line
+        self.checkpoint.save(update_fields=('line',))
+
+    def reject(self, number, reason):
+        self.stats['rejected'] += 1
+        self.errors.append((number, reason))
+        logger.warning('Строка %s отклонена: %s', number, reason)
+
+    def resolve(self, model, field, cache, keys):
+        """Дополнение карты значение поля -> pk одним запросом;
+        ненайденные значения запоминаются как None."""
+        missing = {key for key in keys if key} - cache.keys()
+        if missing:
+            found = dict(model.objects.filter(
+                **{f'{field}__in': missing}).values_list(field, 'pk'))
+            for key in missing:
+                cache[key] = found.get(key)
+
+    def resolve_posts(self, sources):
+        """Дополнение карты id поста во входных данных -> pk
+        постами, импортированными прошлыми запусками."""
+        missing = {str(source) for source in sources
+                   if source is not None} - self.posts.keys()
+        if missing and self.checkpoint is not None:
+            self.posts.update(ImportedPost.objects.filter(
+                checkpoint=self.checkpoint, source__in=missing
+            ).values_list('source', 'post_id'))
+
+    def read(self, path):
+        """Пакеты (номер строки, запись) после отметки."""
+        with open(path, encoding='utf-8') as file:
+            lines = enumerate(file, 1)
+            for _ in islice(lines, self.line):
+                pass
+            while True:
+                batch = list(islice(lines, self.batch_size))
+                if not batch:
+                    return
+                records = []
+                for number, line in batch:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        self.reject(number, 'неверный JSON')
+                        continue
+                    if not isinstance(record, dict) or record.get(
+                            'kind') not in (GROUP, POST, COMMENT):
+                        self.reject(number, 'неизвестный kind')
+                        continue
+                    if any(isinstance(value, (list, dict))
+                           for value in record.values()):
+                        self.reject(number, 'вложенные значения')
+                        continue
+                    records.append((number, record))
+                yield batch[-1][0], records
+
+    def import_groups(self, records):
+        self.resolve(Group, 'slug', self.groups,
+                     [record.get('slug') for _, record in records])
+        groups = []
+        for number, record in records:
+            group = Group(slug=record.get('slug') or '',
+                          title=record.get('title') or '',
+                          description=record.get('description') or '')
+            error = validate(group, ())
+            if error:
+                self.reject(number, error)
+            elif self.groups.get(group.slug) is not None:
+                self.stats['skipped'] += 1
+            else:
+                self.groups[group.slug] = 0
+                groups.append(group)
+        for group in insert(Group, groups):
+            self.groups[group.slug] = group.pk
+        self.stats['groups'] += len(groups)
+
+    def import_posts(self, records):
+        self.resolve(User, 'username', self.users,
+                     [record.get('author') for _, record in records])
+        self.resolve(Group, 'slug', self.groups,
+                     [record.get('group') for _, record in records])
+        self.resolve_posts([record.get('id') for _, record in records])
+        posts, sources = [], []
+        for number, record in records:
+            source = record.get('id')
+            created = parse_created(record.get('created'))
+            author_id = self.users.get(record.get('author'))
+            group_id = self.groups.get(record.get('group'))
+            post = Post(text=record.get('text') or '', author_id=author_id,
+                        group_id=group_id, created=created, updated=created,
+                        thumbnails_ready=True)
+            error = validate(post, ('author', 'group', 'created', 'updated'))
+            if source is not None and str(source) in self.posts:
+                self.stats['skipped'] += 1
+            elif source is not None and len(str(source)) > SOURCE_MAX_LENGTH:
+                self.reject(number, 'слишком длинный id')
+            elif author_id is None:
+                self.reject(number, f'автор {record.get("author")} не найден')
+            elif record.get('group') and group_id is None:
+                self.reject(number, f'группа {record.get("group")} не найдена')
+            elif created is None:
+                self.reject(number, 'неверная дата created')
+            elif error:
+                self.reject(number, error)
+            else:
+                posts.append(post)
+                sources.append(source)
+                if source is not None:
+                    # Повтор id в том же пакете будет пропущен.
+                    self.posts[str(source)] = None
+        insert(Post, posts)
+        imported = {
+            str(source): post.pk
+            for source, post in zip(sources, posts) if source is not None
+        }
+        self.posts.update(imported)
+        counts = Counter(post.author_id for post in posts)
+        for author_id, count in counts.items():
+            increment(Profile.objects.filter(user_id=author_id),
+                      'posts_count', count)
+        search.get_backend().insert_many([
+            (post.pk, None, post.text) for post in posts])
+        timeline.fan_out_posts(posts)
+        self.stats['posts'] += len(posts)
+        return posts, imported
+
+    def import_comments(self, records):
+        self.resolve(User, 'username', self.users,
+                     [record.get('author') for _, record in records])
+        self.resolve_posts([record.get('post') for _, record in records])
+        comments = []
+        for number, record in records:
+            created = parse_created(record.get('created'))
+            post_id = self.posts.get(str(record.get('post')))
+            author_id = self.users.get(record.get('author'))
+            comment = Comment(text=record.get('text') or '', post_id=post_id,
+                              author_id=author_id, created=created)
+            error = validate(comment, ('post', 'author', 'created'))
+            if post_id is None:
+                self.reject(number, f'пост {record.get("post")} не найден')
+            elif author_id is None:
+                self.reject(number, f'автор {record.get("author")} не найден')
+            elif created is None:
+                self.reject(number, 'неверная дата created')
+            elif error:
+                self.reject(number, error)
+            else:
+                comments.append(comment)
+        insert(Comment, comments)
+        counts = Counter(comment.post_id for comment in comments)
+        for post_id, count in counts.items():
+            increment(Post.objects.filter(pk=post_id), 'comments_count',
+                      count)
+        search.get_backend().insert_many([
+            (comment.post_id, comment.pk, comment.text)
+            for comment in comments])
+        self.stats['comments'] += len(comments)
+        return comments
+
+    @transaction.atomic
+    def import_batch(self, line, records):
+        """Пакет одной транзакцией вместе с отметкой: группы,
+        затем посты, затем комментарии, чтобы комментарии
+        находили посты пакета."""
+        by_kind = {GROUP: [], POST: [], COMMENT: []}
+        for number, record in records:
+            by_kind[record['kind']].append((number, record))
+        self.import_groups(by_kind[GROUP])
+        posts, imported = self.import_posts(by_kind[POST])
+        comments = self.import_comments(by_kind[COMMENT])
+        self.save_checkpoint(line, imported)
+        return posts, comments
+
+    def invalidate(self, posts, comments):
+        """Сброс кеша лент после фиксации пакета."""
+        post_ids = {comment.post_id for comment in comments}
+        post_ids.update(post.pk for post in posts)
+        if not post_ids:
+            return
+        rows = Post.objects.filter(pk__in=post_ids).values_list(
+            'pk', 'author__username', 'group__slug')
+        scopes = {caching.INDEX_SCOPE}
+        for pk, username, slug in rows:
+            scopes.update((caching.post_scope(pk),
+                           caching.author_scope(username)))
+            if slug:
+                scopes.add(caching.group_scope(slug))
+        scopes.update(
+            caching.follow_scope(user_id) for user_id in
+            Follow.objects.filter(
+                author_id__in={post.author_id for post in posts}
+            ).values_list('user_id', flat=True).distinct())
+        caching.invalidate(*scopes)
+
+    def run(self, path):
+        """Импорт файла; после каждого пакета отдает номер
+        последней обработанной строки."""
+        for last, records in self.read(path):
+            posts, comments = self.import_batch(last, records)
+            self.line = last
+            self.invalidate(posts, comments)
+            trending.record_comments(comments)
+            yield last
+            self.errors = []
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner
+
+COLUMNS = ('p50_ms', 'p95_ms', 'queries', 'rows', 'template_ms')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, число запросов, прочитанные строки и время '
+        'рендеринга страниц ленты и сравнивает их с базовым замером.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=runner.ITERATIONS)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кеш между запросами.')
+        parser.add_argument('--baseline', default=runner.BASELINE_PATH)
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Записать результаты как новый базовый замер.')
+        parser.add_argument(
+            '--latency-tolerance', type=float,
+            default=runner.LATENCY_TOLERANCE)
+
+    def handle(self, *args, **options):
+        try:
+            results = runner.run(options['iterations'], options['warm'])
+        except runner.BenchmarkError as error:
+            raise CommandError(error)
+        self.stdout.write('{:<14}'.format('view') + ''.join(
+            f'{column:>13}' for column in COLUMNS))
+        for name, result in results.items():
+            self.stdout.write(f'{name:<14}' + ''.join(
+                f'{result[column]:>13}' for column in COLUMNS))
+        if options['update_baseline']:
+            runner.save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS('Базовый замер обновлен.'))
+            return
+        violations = runner.compare(
+            results, runner.load_baseline(options['baseline']),
+            options['latency_tolerance'])
+        if violations:
+            raise CommandError(
+                'Превышены бюджеты:\n' + '\n'.join(violations))
+        self.stdout.write(self.style.SUCCESS('Бюджеты соблюдены.'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner, writes
+
+COLUMNS = ('writes', 'errors', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms',
+           'flush_seconds')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность и задержку добавления '
+        'комментариев при всплеске нагрузки в обычном режиме и в режиме '
+        'отложенной записи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writes', type=int, default=writes.BURST_WRITES)
+        parser.add_argument(
+            '--rate', type=int, default=writes.BURST_RATE,
+            help='Частота отправки комментариев в секунду.')
+        parser.add_argument(
+            '--threads', type=int, default=writes.BURST_THREADS)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не удалять созданные замером комментарии.')
+
+    def handle(self, *args, **options):
+        try:
+            results = writes.run(options['writes'], options['rate'],
+                                 options['threads'], options['keep'])
+        except runner.BenchmarkError as error:
+            raise CommandError(error)
+        self.stdout.write('{:<14}'.format('mode') + ''.join(
+            f'{column:>14}' for column in COLUMNS))
+        for name, result in results.items():
+            self.stdout.write(f'{name:<14}' + ''.join(
+                f'{result.get(column, "-"):>14}' for column in COLUMNS))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import PAGE_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит план выполнения (EXPLAIN) основных запросов лент, '
+        'чтобы заметить запросы без подходящего индекса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Автор для профиля.')
+        parser.add_argument('--reader', help='Читатель ленты подписок.')
+        parser.add_argument('--group', help='Slug группы.')
+        parser.add_argument('--post', type=int, help='Идентификатор поста.')
+
+    def get_object(self, queryset, **lookup):
+        lookup = {key: value for key, value in lookup.items() if value}
+        obj = queryset.filter(**lookup).first()
+        if obj is None:
+            raise CommandError(
+                f'Нет данных для {queryset.model._meta.label}: {lookup}')
+        return obj
+
+    def get_queries(self, options):
+        author = self.get_object(
+            User.objects.filter(posts__isnull=False).order_by('pk'),
+            username=options['username'])
+        reader = self.get_object(
+            User.objects.filter(follower__isnull=False).order_by('pk'),
+            username=options['reader'])
+        group = self.get_object(
+            Group.objects.order_by('pk'), slug=options['group'])
+        post = self.get_object(Post.objects.order_by('pk'),
+                               pk=options['post'])
+        feed = Post.objects.for_feed().order_by('-created', '-pk')
+        last = feed.filter(author=author).last()
+        return (
+            ('index', feed[:PAGE_SIZE]),
+            ('group_posts', feed.filter(group=group)[:PAGE_SIZE]),
+            ('profile', feed.filter(author=author)[:PAGE_SIZE]),
+            ('profile (курсор)', feed.filter(author=author).filter(
+                Q(created__lt=last.created)
+                | Q(created=last.created, pk__lt=last.pk))[:PAGE_SIZE]),
+            ('profile: подписка', Follow.objects.filter(
+                user=reader, author=author)),
+            ('post_detail: комментарии', Comment.objects.select_related(
+                'author').filter(post=post)[:PAGE_SIZE]),
+            *(
+                (f'follow_index: {key}',
+                 timeline.get_ordered(queryset, key)[:PAGE_SIZE + 1])
+                for queryset, key in
+                timeline.get_follow_feed(reader).get_querysets()
+            ),
+        )
+
+    def handle(self, *args, **options):
+        for name, queryset in self.get_queries(options):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = ('Потоковая выгрузка постов, комментариев или подписок '
+            'в NDJSON или CSV; память не зависит от размера таблицы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(export.DATASETS))
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default=export.NDJSON)
+        parser.add_argument(
+            '--since',
+            help='Выгрузить только записи, добавленные после отметки '
+                 'предыдущей выгрузки.')
+        parser.add_argument(
+            '--output', help='Файл выгрузки, по умолчанию stdout.')
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку в gzip.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = export.parse_watermark(options['since'])
+            except ValueError as error:
+                raise CommandError(error)
+        dataset = options['dataset']
+        until = export.get_watermark(dataset, since)
+        chunks = export.render(
+            dataset,
+            export.get_rows(dataset, since, until, options['chunk_size']),
+            options['format'], options['chunk_size'])
+        if options['gzip']:
+            chunks = export.compress(chunks)
+        else:
+            chunks = (chunk.encode() for chunk in chunks)
+        if options['output']:
+            with open(options['output'], 'wb') as file:
+                file.writelines(chunks)
+        else:
+            sys.stdout.buffer.writelines(chunks)
+            sys.stdout.buffer.flush()
+        if until is not None:
+            self.stderr.write(
+                f'Отметка для следующей выгрузки: {until}')
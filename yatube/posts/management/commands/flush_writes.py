@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import writebehind
+
+
+class Command(BaseCommand):
+    help = ('Переносит в базу комментарии и подписки из очереди '
+            'отложенной записи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, опрашивая очередь.')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза между опросами очереди в секундах.')
+
+    def handle(self, *args, **options):
+        while True:
+            done = writebehind.flush()
+            if done:
+                self.stdout.write(f'Перенесено записей: {done}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
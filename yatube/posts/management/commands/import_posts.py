@@ -0,0 +1,43 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import importing
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует группы, посты и комментарии из NDJSON пакетами '
+        'с продолжением прерванного импорта с последней отметки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON.')
+        parser.add_argument(
+            '--batch-size', type=int, default=importing.BATCH_SIZE)
+        parser.add_argument(
+            '--checkpoint',
+            help='Имя отметки в базе, по умолчанию полный путь к файлу.')
+
+    def handle(self, *args, **options):
+        checkpoint = (options['checkpoint']
+                      or os.path.abspath(options['path']))
+        importer = importing.Importer(checkpoint, options['batch_size'])
+        if importer.line:
+            self.stdout.write(
+                f'Продолжение со строки {importer.line + 1}')
+        started = time.monotonic()
+        first = importer.line
+        for line in importer.run(options['path']):
+            for number, reason in importer.errors:
+                self.stderr.write(f'Строка {number}: {reason}')
+            elapsed = max(time.monotonic() - started, 1e-6)
+            stats = importer.stats
+            self.stdout.write(
+                f'Строк: {line}, групп: {stats["groups"]}, '
+                f'постов: {stats["posts"]}, '
+                f'комментариев: {stats["comments"]}, '
+                f'отклонено: {stats["rejected"]}, '
+                f'{(line - first) / elapsed:.0f} строк/с')
+        self.stdout.write(self.style.SUCCESS('Импорт завершен.'))
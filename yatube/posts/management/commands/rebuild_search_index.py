@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов и комментариев.'
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс перестроен ({type(backend).__name__}).'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import TimelineEntry, User
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Перестроить ленты только этих пользователей.')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = User.objects.filter(
+                username__in=options['usernames'])
+        timeline.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает в кеше топы популярных постов сайта и групп '
+            'по комментариям и подпискам за последнюю неделю.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, перестраивая топы периодически.')
+        parser.add_argument(
+            '--interval', type=float, default=60.0 * 10,
+            help='Пауза между перестройками в секундах.')
+
+    def handle(self, *args, **options):
+        while True:
+            count = trending.rebuild()
+            self.stdout.write(f'Учтено событий: {count}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
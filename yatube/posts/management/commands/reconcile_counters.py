@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики постов и профилей.'
+
+    def handle(self, *args, **options):
+        for label, stale in counters.reconcile().items():
+            self.stdout.write(f'{label}: исправлено строк {stale}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts import counters, search, seeding, timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу большим объемом тестовых данных для нагрузочных '
+        'замеров. При одинаковом --seed набор данных воспроизводится.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--batch-size', type=int, default=seeding.BATCH_SIZE)
+        parser.add_argument(
+            '--skew', type=float, default=seeding.SKEW,
+            help='Показатель степенного распределения активности.')
+        parser.add_argument(
+            '--days', type=int, default=seeding.DAYS,
+            help='За сколько дней распределены даты публикаций.')
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счетчики, ленты и поисковый индекс.')
+
+    def step(self, title, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        elapsed = time.monotonic() - started
+        if isinstance(result, int):
+            self.stdout.write(f'{title}: {result} за {elapsed:.1f} с')
+        else:
+            self.stdout.write(f'{title}: {elapsed:.1f} с')
+
+    def handle(self, *args, **options):
+        seeder = seeding.Seeder(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            skew=options['skew'],
+            days=options['days'],
+        )
+        self.step('Пользователи', seeder.create_users, options['users'])
+        self.step('Группы', seeder.create_groups, options['groups'])
+        self.step('Посты', seeder.create_posts, options['posts'])
+        self.step('Комментарии', seeder.create_comments, options['comments'])
+        self.step('Подписки', seeder.create_follows, options['follows'])
+        if not options['skip_derived']:
+            # bulk_create не отправляет сигналы, поэтому счетчики,
+            # ленты и поисковый индекс пересчитываются целиком.
+            self.step('Счетчики', counters.reconcile)
+            self.step('Ленты подписок', timeline.rebuild)
+            self.step('Поисковый индекс', search.rebuild)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL_SIZE = 200
+
+
+def backfill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    for user_id, author_id in Follow.objects.values_list(
+            'user_id', 'author_id').iterator():
+        posts = Post.objects.filter(author_id=author_id).order_by(
+            '-created').values_list('id', 'created')[:BACKFILL_SIZE]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, author_id=author_id,
+                           post_id=post_id, created=created)
+             for post_id, created in posts],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0005_auto_20220630_1339'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(verbose_name='Дата создания поста')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-created'], name='timeline_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='timeline_unique_user_post'),
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comments_count(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(comments_count=Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+            'post').annotate(total=Count('pk')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:19
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(updated=F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(copy_created, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def enqueue_existing_images(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    ThumbnailJob.objects.bulk_create(
+        [ThumbnailJob(post_id=post_id) for post_id in Post.objects.exclude(
+            image='').values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=False, verbose_name='Миниатюры готовы'),
+        ),
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Обрабатывается'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnail_jobs', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'ordering': ('-created',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='thumbnailjob',
+            index=models.Index(fields=['status', 'created'], name='thumbnail_job_status'),
+        ),
+        migrations.RunPython(
+            enqueue_existing_images, migrations.RunPython.noop),
+    ]
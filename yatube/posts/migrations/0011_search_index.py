@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:23
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    """Таблица SQLite FTS5; на других СУБД и без FTS5
+    поиск работает по инвертированному индексу SearchToken."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search_fts USING fts5('
+            'body, post_id UNINDEXED, comment_id UNINDEXED)')
+    except OperationalError:
+        pass
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('frequency', models.PositiveIntegerField(default=1, verbose_name='Число вхождений')),
+                ('comment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Comment', verbose_name='Комментарий')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Пост')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchtoken',
+            index=models.Index(fields=['term'], name='search_token_term'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:25
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Перед созданием уникального ограничения оставляем
+    одну (самую раннюю) подписку на каждую пару."""
+    Follow = apps.get_model('posts', 'Follow')
+    keep = Follow.objects.order_by().values('user', 'author').annotate(
+        first=Min('pk')).values_list('first', flat=True)
+    Follow.objects.exclude(pk__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created'], name='comment_post_created'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created'], name='post_author_created'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-created'], name='post_group_created'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='follow_unique_user_author'),
+        ),
+    ]
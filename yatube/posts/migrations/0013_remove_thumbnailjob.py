@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:59
+
+import json
+
+from django.db import migrations
+
+
+def move_thumbnail_jobs(apps, schema_editor):
+    """Незавершенные задания миниатюр переносятся в общую
+    очередь фоновых задач."""
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    Task = apps.get_model('core', 'Task')
+    post_ids = ThumbnailJob.objects.filter(
+        status__in=('pending', 'processing')).values_list(
+        'post_id', flat=True).distinct()
+    Task.objects.bulk_create([
+        Task(name='posts.tasks.generate_thumbnails',
+             args=json.dumps([post_id]), key=f'thumbnails:{post_id}')
+        for post_id in post_ids
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_thumbnail_jobs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='ThumbnailJob',
+        ),
+    ]
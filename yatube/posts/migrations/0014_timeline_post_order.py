@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_remove_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_created',
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-created', '-post'], name='timeline_user_created'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:25
+
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def fill_dimensions(apps, schema_editor):
+    """Размеры уже загруженных изображений: иначе ImageField
+    открывал бы файл при каждой загрузке поста из базы."""
+    Post = apps.get_model('posts', 'Post')
+    rows = Post.objects.exclude(image='').filter(
+        image_width__isnull=True).values_list('pk', 'image')
+    for pk, name in rows.iterator():
+        try:
+            with default_storage.open(name) as file:
+                width, height = get_image_dimensions(file)
+        except OSError:
+            continue
+        if width and height:
+            Post.objects.filter(pk=pk).update(
+                image_width=width, image_height=height)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_timeline_post_order'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, height_field='image_height', help_text='Загрузите изображение', upload_to='posts/', verbose_name='Изображение', width_field='image_width'),
+        ),
+        migrations.RunPython(fill_dimensions, migrations.RunPython.noop),
+    ]
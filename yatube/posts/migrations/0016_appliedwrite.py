@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppliedWrite',
+            fields=[
+                ('token', models.CharField(max_length=32, primary_key=True, serialize=False, verbose_name='Токен')),
+                ('applied', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата применения')),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_appliedwrite'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Импорт')),
+                ('line', models.PositiveIntegerField(default=0, verbose_name='Последняя строка')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportedPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=64, verbose_name='Id во входных данных')),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posts', to='posts.ImportCheckpoint', verbose_name='Импорт')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Пост')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='importedpost',
+            constraint=models.UniqueConstraint(fields=('checkpoint', 'source'), name='imported_post_unique_source'),
+        ),
+    ]
@@ -1,11 +1,24 @@
 from core.models import CreatedModel
 
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth import get_user_model
 
+from .images import normalize_image
+
 User = get_user_model()
 
 
+class AtomicSaveMixin:
+    """Сохранение вместе с обработчиками post_save в одной транзакции:
+    счетчики, которые меняют сигналы, не расходятся с записью."""
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
 class Group(models.Model):
     title = models.CharField(
         max_length=200,
@@ -25,7 +38,14 @@ class Group(models.Model):
         return self.title
 
 
-class Post(CreatedModel):
+class PostQuerySet(models.QuerySet):
+
+    def for_feed(self):
+        """Посты со связанными автором и группой для вывода в лентах."""
+        return self.select_related('author', 'group')
+
+
+class Post(AtomicSaveMixin, CreatedModel):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Введите текст поста')
@@ -45,15 +65,45 @@ class Post(CreatedModel):
     image = models.ImageField(
         upload_to='posts/',
         blank=True,
+        width_field='image_width',
+        height_field='image_height',
         verbose_name='Изображение',
         help_text='Загрузите изображение'
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина изображения', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота изображения', null=True, blank=True, editable=False)
+    thumbnails_ready = models.BooleanField(
+        'Миниатюры готовы', default=False)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta(CreatedModel.Meta):
+        indexes = (
+            models.Index(
+                fields=('author', '-created'), name='post_author_created'),
+            models.Index(
+                fields=('group', '-created'), name='post_group_created'),
+        )
+
+    def save(self, *args, **kwargs):
+        """Новая загрузка уменьшается и перекодируется до сохранения,
+        откуда бы она ни пришла: из формы сайта или из админки.
+        Размеры итогового изображения ImageField записывает
+        в image_width и image_height."""
+        if self.image and not self.image._committed:
+            self.image = normalize_image(self.image)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.text[:15]
 
 
-class Comment(CreatedModel):
+class Comment(AtomicSaveMixin, CreatedModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -70,11 +120,17 @@ class Comment(CreatedModel):
         help_text='Введите текст комментария'
     )
 
+    class Meta(CreatedModel.Meta):
+        indexes = (
+            models.Index(
+                fields=('post', '-created'), name='comment_post_created'),
+        )
+
     def __str__(self):
         return self.text
 
 
-class Follow(CreatedModel):
+class Follow(AtomicSaveMixin, CreatedModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -88,5 +144,140 @@ class Follow(CreatedModel):
         verbose_name='Отслеживаемый автор'
     )
 
+    class Meta(CreatedModel.Meta):
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='follow_unique_user_author'),
+        )
+
     def __str__(self):
         return f'{self.user} follows {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write),
+    поле created дублирует дату поста для сортировки по индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('user', '-created', '-post'),
+                name='timeline_user_created'),
+            models.Index(
+                fields=('user', 'author'), name='timeline_user_author'),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='timeline_unique_user_post'),
+        )
+
+    def __str__(self):
+        return f'{self.user} <- {self.post_id}'
+
+
+class SearchToken(models.Model):
+    """Запись инвертированного индекса для поиска без FTS5.
+
+    Хранит основу слова, документ (пост или комментарий к нему)
+    и число вхождений основы в документ.
+    """
+    term = models.CharField('Основа слова', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост',
+    )
+    comment = models.ForeignKey(
+        Comment,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Комментарий',
+    )
+    frequency = models.PositiveIntegerField('Число вхождений', default=1)
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('term',), name='search_token_term'),
+        )
+
+    def __str__(self):
+        return self.term
+
+
+class AppliedWrite(models.Model):
+    """Запись очереди отложенных записей, уже перенесенная в базу.
+
+    Токен сохраняется в одной транзакции с самой записью, поэтому
+    пакет, повторно разобранный после сбоя, ее пропустит.
+    """
+    token = models.CharField('Токен', max_length=32, primary_key=True)
+    applied = models.DateTimeField(
+        'Дата применения', auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.token
+
+
+class ImportCheckpoint(models.Model):
+    """Отметка импорта: последняя перенесенная строка входного файла.
+
+    Обновляется в одной транзакции с пакетом, поэтому прерванный
+    импорт продолжается ровно с первой неперенесенной строки.
+    """
+    name = models.CharField('Импорт', max_length=255, unique=True)
+    line = models.PositiveIntegerField('Последняя строка', default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.line}'
+
+
+class ImportedPost(models.Model):
+    """Соответствие id поста во входных данных созданному посту."""
+    checkpoint = models.ForeignKey(
+        ImportCheckpoint,
+        on_delete=models.CASCADE,
+        related_name='posts',
+        verbose_name='Импорт',
+    )
+    source = models.CharField('Id во входных данных', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост',
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('checkpoint', 'source'),
+                name='imported_post_unique_source'),
+        )
+
+    def __str__(self):
+        return f'{self.source} -> {self.post_id}'
@@ -0,0 +1,284 @@
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+
+from .models import Comment, Post, SearchToken
+
+FTS_TABLE: str = 'posts_search_fts'
+RESULTS_LIMIT: int = 500
+REBUILD_BATCH_SIZE: int = 1000
+# Совпадение в тексте поста весомее совпадения в комментарии.
+COMMENT_WEIGHT: float = 0.5
+
+WORD = re.compile(r'\w+')
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'все', 'да', 'для', 'до', 'же',
+    'за', 'и', 'из', 'или', 'к', 'как', 'ли', 'на', 'над', 'не', 'ни',
+    'но', 'о', 'об', 'от', 'по', 'под', 'при', 'с', 'со', 'то', 'у',
+    'что', 'это',
+))
+
+# Упрощенный стеммер Портера (Snowball) для русского языка.
+VOWELS = 'аеиоуыэюя'
+RV = re.compile(f'^(.*?[{VOWELS}])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|'
+    r'ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$')
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL = re.compile(f'.*[^{VOWELS}]+[{VOWELS}].*ость?$')
+DERIVATIONAL_SUFFIX = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа русского слова; остальные слова возвращаются как есть.
+
+    Частые слова повторяются, поэтому основы кешируются.
+    """
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+    stripped = PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        stripped = ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.match(rv):
+        rv = DERIVATIONAL_SUFFIX.sub('', rv, 1)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def get_connection(write=False):
+    """Соединение с базой постов по роутеру: поиск читает
+    из реплики, если она выбрана для запроса, индекс пишется
+    в основную базу."""
+    if write:
+        return connections[router.db_for_write(Post)]
+    return connections[router.db_for_read(Post)]
+
+
+def analyze(text):
+    """Разбиение текста на основы слов без стоп-слов."""
+    return [stem(word) for word in WORD.findall(text.lower())
+            if word not in STOP_WORDS]
+
+
+class InvertedIndexBackend:
+    """Инвертированный индекс в таблице SearchToken.
+
+    Документ находится, если содержит все основы запроса;
+    ранжирование по TF-IDF среди документов с основами запроса.
+    """
+
+    def insert(self, post_id, comment_id, text):
+        self.insert_many([(post_id, comment_id, text)])
+
+    def insert_many(self, documents):
+        SearchToken.objects.bulk_create([
+            SearchToken(term=term[:64], post_id=post_id,
+                        comment_id=comment_id, frequency=frequency)
+            for post_id, comment_id, text in documents
+            for term, frequency in Counter(analyze(text)).items()
+        ])
+
+    def remove(self, post_id, comment_id=None):
+        SearchToken.objects.filter(
+            post_id=post_id, comment_id=comment_id).delete()
+
+    def clear(self):
+        SearchToken.objects.all().delete()
+
+    def query(self, terms, limit):
+        """Пересечение, ранжирование и отбор лучших выполняются
+        в базе одним запросом: в Python приходит не больше limit
+        строк, сколько бы документов ни содержало частые основы."""
+        table = SearchToken._meta.db_table
+        placeholders = ', '.join(['%s'] * len(terms))
+        with get_connection().cursor() as cursor:
+            cursor.execute(
+                f'WITH matched AS ('
+                f'SELECT term, post_id, comment_id, frequency FROM {table} '
+                f'WHERE term IN ({placeholders})), '
+                'document_frequency AS ('
+                'SELECT term, COUNT(*) AS documents FROM matched '
+                'GROUP BY term), '
+                'total AS (SELECT COUNT(*) + 1 AS documents FROM ('
+                'SELECT DISTINCT post_id, comment_id FROM matched) AS found) '
+                'SELECT matched.post_id, matched.comment_id, '
+                'SUM((1 + LN(matched.frequency)) * LN(1 + total.documents '
+                '* 1.0 / document_frequency.documents)) AS score '
+                'FROM matched JOIN document_frequency '
+                'ON document_frequency.term = matched.term CROSS JOIN total '
+                'GROUP BY matched.post_id, matched.comment_id '
+                'HAVING COUNT(*) = %s ORDER BY score DESC LIMIT %s',
+                [*terms, len(terms), limit])
+            return cursor.fetchall()
+
+
+class Fts5Backend:
+    """Полнотекстовый индекс SQLite FTS5 над основами слов.
+
+    В таблицу пишутся уже приведенные к основам тексты,
+    поэтому морфология русского языка учитывается и здесь.
+    rowid вычисляется из идентификатора документа, чтобы
+    удаление шло по первичному ключу, а не перебором таблицы.
+    """
+
+    @staticmethod
+    def rowid(post_id, comment_id):
+        return comment_id * 2 + 1 if comment_id else post_id * 2
+
+    def insert(self, post_id, comment_id, text):
+        self.insert_many([(post_id, comment_id, text)])
+
+    def insert_many(self, documents):
+        with get_connection(write=True).cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, body, post_id, comment_id) '
+                'VALUES (%s, %s, %s, %s)',
+                [(self.rowid(post_id, comment_id), ' '.join(analyze(text)),
+                  post_id, comment_id)
+                 for post_id, comment_id, text in documents])
+
+    def remove(self, post_id, comment_id=None):
+        with get_connection(write=True).cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [self.rowid(post_id, comment_id)])
+
+    def clear(self):
+        with get_connection(write=True).cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def query(self, terms, limit):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with get_connection().cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id, comment_id, -bm25({FTS_TABLE}) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}) LIMIT %s', [match, limit])
+            return cursor.fetchall()
+
+
+_fts5_databases = {}
+
+
+def has_fts5():
+    """Есть ли в базе постов таблица FTS5 (проверяется один раз)."""
+    connection = get_connection()
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts5_databases:
+        with connection.cursor() as cursor:
+            _fts5_databases[name] = (
+                FTS_TABLE in connection.introspection.table_names(cursor))
+    return _fts5_databases[name]
+
+
+def get_backend():
+    """Бэкенд поиска по настройке SEARCH_BACKEND: fts5, inverted или auto."""
+    name = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if name == 'fts5' or (name == 'auto' and has_fts5()):
+        return Fts5Backend()
+    return InvertedIndexBackend()
+
+
+def index_post(post):
+    backend = get_backend()
+    backend.remove(post.pk)
+    backend.insert(post.pk, None, post.text)
+
+
+def index_comment(comment):
+    backend = get_backend()
+    backend.remove(comment.post_id, comment.pk)
+    backend.insert(comment.post_id, comment.pk, comment.text)
+
+
+def remove_post(post):
+    get_backend().remove(post.pk)
+
+
+def remove_comment(comment):
+    get_backend().remove(comment.post_id, comment.pk)
+
+
+def search(query, limit=RESULTS_LIMIT):
+    """Найденные документы: список (post_id, comment_id, score)."""
+    terms = list(dict.fromkeys(analyze(query)))
+    if not terms:
+        return []
+    try:
+        return get_backend().query(terms, limit)
+    except OperationalError:
+        return []
+
+
+def search_posts(query, limit=RESULTS_LIMIT):
+    """Идентификаторы постов по убыванию релевантности.
+
+    Пост находится и по своему тексту, и по тексту комментариев.
+    """
+    scores = defaultdict(float)
+    for post_id, comment_id, score in search(query, limit):
+        weight = COMMENT_WEIGHT if comment_id else 1
+        scores[post_id] = max(scores[post_id], score * weight)
+    return sorted(scores, key=lambda post_id: -scores[post_id])
+
+
+def search_comments(query, limit=RESULTS_LIMIT):
+    return [comment_id for _, comment_id, _ in search(query, limit)
+            if comment_id]
+
+
+@transaction.atomic
+def rebuild():
+    """Полная перестройка индекса по всем постам и комментариям.
+
+    Выполняется одной транзакцией пакетами по REBUILD_BATCH_SIZE:
+    без транзакции SQLite фиксирует каждую вставку отдельно.
+    """
+    backend = get_backend()
+    backend.clear()
+    posts = (
+        (post_id, None, text) for post_id, text in
+        Post.objects.values_list('pk', 'text').iterator())
+    comments = Comment.objects.values_list(
+        'post_id', 'pk', 'text').iterator()
+    for documents in (posts, comments):
+        batch = list(islice(documents, REBUILD_BATCH_SIZE))
+        while batch:
+            backend.insert_many(batch)
+            batch = list(islice(documents, REBUILD_BATCH_SIZE))
@@ -0,0 +1,256 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import AutoField, Max
+from django.utils import timezone
+from faker import Faker
+
+from users.models import Profile
+
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE: int = 5000
+# Показатель степенного распределения: чем больше, тем сильнее перекос.
+SKEW: float = 1.1
+DAYS: int = 365
+# Доля постов, опубликованных в группе.
+GROUP_SHARE: float = 0.7
+TEXT_POOL_SIZE: int = 1000
+MAX_SENTENCES: int = 5
+
+
+def get_timestamp_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+
+
+def create_raw(model, objects, ignore_conflicts=False):
+    """bulk_create, сохраняющий даты из объектов.
+
+    bulk_create перезаписывает auto_now и auto_now_add поля текущим
+    временем. Здесь даты проставляются в самих объектах (незаданные —
+    текущим временем), а строки вставляются без pre_save полей, как
+    при загрузке фикстур. Поля модели общие для всех потоков, поэтому
+    их флаги не меняются.
+    """
+    now = timezone.now()
+    timestamp_fields = get_timestamp_fields(model)
+    for obj in objects:
+        for field in timestamp_fields:
+            if getattr(obj, field.attname) is None:
+                setattr(obj, field.attname, now)
+    manager = model._base_manager
+    db = router.db_for_write(model)
+    ops = connections[db].ops
+    with transaction.atomic(using=db, savepoint=False):
+        for with_pk in (True, False):
+            batch = [obj for obj in objects if (obj.pk is not None) == with_pk]
+            fields = [
+                field for field in model._meta.concrete_fields
+                if with_pk or not isinstance(field, AutoField)
+            ]
+            size = max(ops.bulk_batch_size(fields, batch), 1)
+            for start in range(0, len(batch), size):
+                manager._insert(
+                    batch[start:start + size], fields=fields, raw=True,
+                    using=db, ignore_conflicts=ignore_conflicts)
+    for obj in objects:
+        obj._state.adding = False
+        obj._state.db = db
+    return objects
+
+
+def get_last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def bulk_insert(model, objects, batch_size=BATCH_SIZE, **kwargs):
+    """Вставка объектов из генератора пакетами по batch_size.
+
+    Генератор читается по мере вставки, поэтому в памяти
+    одновременно находится не больше одного пакета.
+    """
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            create_raw(model, batch, **kwargs)
+            batch = []
+    if batch:
+        create_raw(model, batch, **kwargs)
+
+
+def new_pks(model, last_pk):
+    """Ключи строк, вставленных после last_pk, в порядке вставки.
+
+    bulk_create в SQLite не возвращает первичные ключи,
+    поэтому они выбираются отдельным запросом.
+    """
+    return list(model.objects.filter(pk__gt=last_pk).order_by(
+        'pk').values_list('pk', flat=True))
+
+
+def insert(model, objects):
+    """create_raw с первичными ключами.
+
+    SQLite не возвращает ключи из массовой вставки, они выбираются
+    после вставки. Если за это время в таблицу писал кто-то еще,
+    ключи не сопоставить, и транзакция откатывается ошибкой.
+    Размер пакета вставки выбирает бэкенд по лимиту переменных.
+    """
+    last_pk = get_last_pk(model)
+    create_raw(model, objects)
+    if objects and objects[0].pk is None:
+        pks = new_pks(model, last_pk)
+        if len(pks) != len(objects):
+            raise DatabaseError(
+                f'Параллельная запись в {model._meta.label} '
+                'во время массовой вставки')
+        for obj, pk in zip(objects, pks):
+            obj.pk = pk
+    return objects
+
+
+class Seeder:
+    """Генератор тестовых данных с перекосом активности.
+
+    Авторы получают посты и подписчиков по степенному закону
+    (закон Ципфа): немногие авторы пишут и собирают большую часть,
+    так же распределены комментарии по постам и посты по группам.
+    С одинаковым seed получается одинаковый набор данных.
+    """
+
+    def __init__(self, seed=None, batch_size=BATCH_SIZE, skew=SKEW,
+                 days=DAYS):
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        if seed is not None:
+            self.fake.seed_instance(seed)
+        self.batch_size = batch_size
+        self.skew = skew
+        self.now = timezone.now()
+        self.period = timedelta(days=days).total_seconds()
+        self.texts = [self.fake.sentence(nb_words=12)
+                      for _ in range(TEXT_POOL_SIZE)]
+        self.user_ids = []
+        self.group_ids = []
+        self.post_ages = {}
+
+    def power_law(self, ids):
+        """Перемешанные ids и накопленные веса 1 / rank ** skew
+        для random.choices."""
+        ids = list(ids)
+        self.rng.shuffle(ids)
+        return ids, list(accumulate(
+            1 / rank ** self.skew for rank in range(1, len(ids) + 1)))
+
+    def text(self):
+        return ' '.join(self.rng.choices(
+            self.texts, k=self.rng.randint(1, MAX_SENTENCES)))
+
+    def moment(self, age):
+        return self.now - timedelta(seconds=age)
+
+    def create_users(self, count):
+        last_pk = get_last_pk(User)
+        password = make_password(None)
+
+        def users():
+            for number in range(last_pk + 1, last_pk + count + 1):
+                yield User(
+                    username=f'{self.fake.user_name()}{number}',
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                    password=password,
+                    date_joined=self.moment(self.rng.uniform(
+                        0, self.period)),
+                )
+        bulk_insert(User, users(), self.batch_size)
+        self.user_ids = new_pks(User, last_pk)
+        bulk_insert(Profile, (
+            Profile(user_id=user_id) for user_id in self.user_ids
+        ), self.batch_size)
+        return len(self.user_ids)
+
+    def create_groups(self, count):
+        last_pk = get_last_pk(Group)
+        bulk_insert(Group, (
+            Group(
+                title=f'{self.fake.word().capitalize()} {number}',
+                slug=f'group-{number}',
+                description=self.text(),
+            )
+            for number in range(last_pk + 1, last_pk + count + 1)
+        ), self.batch_size)
+        self.group_ids = new_pks(Group, last_pk)
+        return len(self.group_ids)
+
+    def create_posts(self, count):
+        authors, author_weights = self.power_law(self.user_ids)
+        groups, group_weights = self.power_law(self.group_ids)
+        ages = [self.rng.uniform(0, self.period) for _ in range(count)]
+
+        def posts():
+            for age in ages:
+                created = self.moment(age)
+                group_id = None
+                if groups and self.rng.random() < GROUP_SHARE:
+                    group_id = self.rng.choices(
+                        groups, cum_weights=group_weights)[0]
+                yield Post(
+                    text=self.text(),
+                    author_id=self.rng.choices(
+                        authors, cum_weights=author_weights)[0],
+                    group_id=group_id,
+                    created=created,
+                    updated=created,
+                    thumbnails_ready=True,
+                )
+        last_pk = get_last_pk(Post)
+        bulk_insert(Post, posts(), self.batch_size)
+        self.post_ages = dict(zip(new_pks(Post, last_pk), ages))
+        return len(self.post_ages)
+
+    def create_comments(self, count):
+        posts, post_weights = self.power_law(self.post_ages)
+
+        def comments():
+            for post_id in self.rng.choices(
+                    posts, cum_weights=post_weights, k=count):
+                yield Comment(
+                    post_id=post_id,
+                    author_id=self.rng.choice(self.user_ids),
+                    text=self.text(),
+                    created=self.moment(self.rng.uniform(
+                        0, self.post_ages[post_id])),
+                )
+        if not posts:
+            return 0
+        bulk_insert(Comment, comments(), self.batch_size)
+        return count
+
+    def create_follows(self, count):
+        """Подписки: подписчик выбирается равномерно,
+        автор - по степенному закону."""
+        authors, author_weights = self.power_law(self.user_ids)
+        pairs = set()
+        attempts = count * 3
+        while len(pairs) < count and attempts and len(authors) > 1:
+            attempts -= 1
+            user_id = self.rng.choice(self.user_ids)
+            author_id = self.rng.choices(
+                authors, cum_weights=author_weights)[0]
+            if user_id != author_id:
+                pairs.add((user_id, author_id))
+        bulk_insert(Follow, (
+            Follow(user_id=user_id, author_id=author_id,
+                   created=self.moment(self.rng.uniform(0, self.period)))
+            for user_id, author_id in sorted(pairs)
+        ), self.batch_size, ignore_conflicts=True)
+        return len(pairs)
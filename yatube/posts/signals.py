@@ -0,0 +1,108 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from users.models import Profile
+
+from . import caching, tasks
+from .counters import increment
+from .models import Comment, Follow, Group, Post
+
+# Сигналы в транзакции записи меняют счетчики на единицу и сбрасывают
+# кеш страниц, которые увидит автор изменения; ленты подписок,
+# поисковый индекс и ленты подписчиков обновляет фоновая задача
+# после коммита.
+
+
+def get_image_name(instance):
+    """Имя файла изображения без чтения отложенного поля."""
+    image = instance.__dict__.get('image')
+    return getattr(image, 'name', image)
+
+
+@receiver(post_init, sender=Post)
+def remember_loaded(sender, instance, **kwargs):
+    """Запоминаем исходные группу и изображение: при смене группы
+    сбрасывается кеш страницы прежней группы, при смене изображения
+    готовятся миниатюры. Отложенные поля не читаются, чтобы
+    не вызвать лишний запрос."""
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+    instance._loaded_image = get_image_name(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """Новый пост попадает в ленты подписчиков и в счетчик автора;
+    для нового изображения, откуда бы ни был сохранен пост,
+    ставится задача подготовки миниатюр."""
+    if raw:
+        return
+    if created:
+        increment(Profile.objects.filter(user_id=instance.author_id),
+                  'posts_count')
+    tasks.post_saved.delay(instance.pk, instance.author_id, created)
+    image = get_image_name(instance)
+    if image and (created or image != instance._loaded_image):
+        tasks.enqueue_thumbnails(instance)
+    caching.invalidate_post(
+        instance, [instance._loaded_group_id], followers=False)
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = image
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    increment(Profile.objects.filter(user_id=instance.author_id),
+              'posts_count', -1)
+    tasks.post_deleted.delay(instance.pk, instance.author_id)
+    caching.invalidate_post(instance, followers=False)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        increment(Post.objects.filter(pk=instance.post_id),
+                  'comments_count')
+    tasks.comment_changed.delay(instance.post_id, instance.pk, created)
+    if created:
+        caching.invalidate_post(instance.post, followers=False)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    increment(Post.objects.filter(pk=instance.post_id),
+              'comments_count', -1)
+    tasks.comment_changed.delay(instance.post_id, instance.pk)
+    caching.invalidate(caching.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    """После подписки в ленту добавляются последние посты автора."""
+    if created and not raw:
+        increment(Profile.objects.filter(user_id=instance.author_id),
+                  'followers_count')
+        increment(Profile.objects.filter(user_id=instance.user_id),
+                  'following_count')
+        tasks.follow_changed.delay(
+            instance.user_id, instance.author_id, True)
+        caching.invalidate_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """После отписки посты автора убираются из ленты."""
+    increment(Profile.objects.filter(user_id=instance.author_id),
+              'followers_count', -1)
+    increment(Profile.objects.filter(user_id=instance.user_id),
+              'following_count', -1)
+    tasks.follow_changed.delay(instance.user_id, instance.author_id)
+    caching.invalidate_follow(instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.invalidate(
+            caching.INDEX_SCOPE, caching.group_scope(instance.slug))
@@ -0,0 +1,112 @@
+from django.utils import timezone
+
+from core.tasks import task
+
+from . import caching, search, thumbnails, timeline, trending
+from .models import Comment, Follow, Post
+
+# На каждое изменение ставится одна задача со всеми его последствиями,
+# поэтому время запроса не зависит от их числа. Задачи получают только
+# ключи объектов и перечитывают данные из базы: повтор задачи или одна
+# задача вместо нескольких одинаковых (ключ идемпотентности) дают
+# тот же результат.
+
+
+@task(key='thumbnails:{0}')
+def generate_thumbnails(post_id):
+    """Подготовка вариантов изображения; до ее окончания шаблоны
+    показывают заглушку."""
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None:
+        return
+    if post.image:
+        thumbnails.generate(post)
+    Post.objects.filter(pk=post_id).update(
+        thumbnails_ready=True, updated=timezone.now())
+    caching.invalidate_post(post)
+
+
+def enqueue_thumbnails(post):
+    if post.thumbnails_ready:
+        Post.objects.filter(pk=post.pk).update(thumbnails_ready=False)
+        post.thumbnails_ready = False
+    generate_thumbnails.delay(post.pk)
+
+
+@task(key='post_saved:{0}:{2}')
+def post_saved(post_id, author_id, created):
+    """Новый пост раскладывается по лентам подписчиков;
+    после правки сбрасываются ленты подписчиков."""
+    if created:
+        fan_out_post(post_id)
+    else:
+        caching.invalidate_followers(author_id)
+    reindex_post(post_id)
+
+
+@task(key='post_deleted:{0}')
+def post_deleted(post_id, author_id):
+    caching.invalidate_followers(author_id)
+    reindex_post(post_id)
+
+
+@task(key='comment_changed:{1}')
+def comment_changed(post_id, comment_id, created=False):
+    """Новый комментарий, кроме индекса,
+    повышает оценку поста в популярном."""
+    comment = reindex_comment(post_id, comment_id)
+    if created and comment is not None:
+        trending.record_comments([comment])
+
+
+@task(key='follow_changed:{0}:{1}')
+def follow_changed(user_id, author_id, created=False):
+    timeline.sync_fanout(author_id)
+    follow = sync_timeline(user_id, author_id)
+    if created and follow is not None:
+        trending.record_follow(follow)
+
+
+@task(key='rebuild_trending')
+def rebuild_trending():
+    trending.rebuild()
+
+
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'created').first()
+    if post is not None:
+        timeline.fan_out_post(post)
+        caching.invalidate_followers(post.author_id)
+
+
+def sync_timeline(user_id, author_id):
+    """Лента подписчика приводится к текущему состоянию подписки:
+    после подписки в нее добавляются посты автора, после отписки
+    они удаляются. Возвращает подписку, если она есть."""
+    follow = Follow.objects.filter(
+        user_id=user_id, author_id=author_id).first()
+    if follow is not None:
+        timeline.backfill(follow)
+    else:
+        timeline.prune(Follow(user_id=user_id, author_id=author_id))
+    caching.invalidate(caching.follow_scope(user_id))
+    return follow
+
+
+def reindex_post(post_id):
+    post = Post.objects.filter(pk=post_id).only('pk', 'text').first()
+    if post is None:
+        search.get_backend().remove(post_id)
+    else:
+        search.index_post(post)
+
+
+def reindex_comment(post_id, comment_id):
+    comment = Comment.objects.filter(pk=comment_id).only(
+        'pk', 'post_id', 'text', 'created').first()
+    if comment is None:
+        search.get_backend().remove(post_id, comment_id)
+    else:
+        search.index_comment(comment)
+    return comment
@@ -0,0 +1,36 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+CONTENT_TYPES = {
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+
+
+@register.inclusion_tag('posts/includes/responsive_image.html')
+def responsive_image(image, sizes='(max-width: 992px) 100vw, 960px'):
+    """Адаптивное изображение: <picture> с srcset по всем вариантам.
+
+    Последний формат реестра выводится в <img> как запасной вариант
+    для браузеров без поддержки остальных форматов.
+    """
+    variants = thumbnails.get_ready_variants(image)
+    sources = [
+        {
+            'type': CONTENT_TYPES[image_format],
+            'srcset': ', '.join(
+                f'{variant.url} {width}w' for width, variant in zip(
+                    thumbnails.VARIANT_WIDTHS, images)),
+        }
+        for image_format, images in variants.items()
+    ]
+    fallback = variants[thumbnails.get_formats()[-1]][-1]
+    return {
+        'sources': sources[:-1],
+        'srcset': sources[-1]['srcset'],
+        'sizes': sizes,
+        'image': fallback,
+    }
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def forbid_duplicate_queries(settings):
+    """Любой запрос к сайту в тестах posts падает при шаблоне N+1."""
+    settings.QUERY_INSPECTOR = 'raise'
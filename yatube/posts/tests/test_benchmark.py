@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from benchmarks import runner
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class BenchmarkCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовое описание',
+            slug='test-slug',
+        )
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.reader = User.objects.create_user(username='TestReader')
+        post = Post.objects.create(
+            text='Тестовый текст', author=cls.author, group=cls.group)
+        Comment.objects.create(
+            text='Тестовый комментарий', author=cls.reader, post=post)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+
+    def benchmark(self, **options):
+        call_command('benchmark', iterations=2, baseline=self.baseline,
+                     stdout=StringIO(), **options)
+
+    def test_update_baseline(self):
+        """Базовый замер содержит метрики всех представлений ленты."""
+        self.benchmark(update_baseline=True)
+        with open(self.baseline) as baseline:
+            results = json.load(baseline)
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'})
+        self.assertGreater(results['post_detail']['queries'], 0)
+        self.benchmark(latency_tolerance=100)
+
+    def test_budget_exceeded(self):
+        """Превышение бюджета запросов завершает команду ошибкой."""
+        runner.save_baseline({
+            'index': {'queries': 0, 'rows': 0, 'p95_ms': 1000},
+        }, self.baseline)
+        with self.assertRaisesMessage(CommandError, 'index: queries'):
+            self.benchmark()
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+    }})
+    def test_shared_cache_not_cleared(self):
+        """Замер без кеша не запускается с общим кешем."""
+        with self.assertRaisesMessage(CommandError, 'CACHE_PROFILE=locmem'):
+            self.benchmark()
@@ -0,0 +1,100 @@
+from http import HTTPStatus
+
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Task
+from core.tasks import drain
+from users.models import Profile
+
+from .. import counters
+from ..models import Comment, Follow, Post, User
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.author,
+        )
+
+    def get_profile(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Счетчик постов автора меняется при создании и удалении поста."""
+        self.assertEqual(self.get_profile(self.author).posts_count, 1)
+        post = Post.objects.create(text='Еще один пост', author=self.author)
+        self.assertEqual(self.get_profile(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.get_profile(self.author).posts_count, 1)
+
+    def test_comment_counter(self):
+        """Счетчик комментариев поста меняется вместе с комментариями."""
+        comment = Comment.objects.create(
+            text='Тестовый комментарий',
+            author=self.user,
+            post=self.post,
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счетчики подписчиков и подписок."""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.get_profile(self.author).followers_count, 1)
+        self.assertEqual(self.get_profile(self.user).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.get_profile(self.author).followers_count, 0)
+        self.assertEqual(self.get_profile(self.user).following_count, 0)
+
+    def test_missing_profile_created(self):
+        """Страницы автора без профиля открываются, профиль
+        создается с пересчитанными счетчиками."""
+        Profile.objects.filter(user=self.author).delete()
+        for url in (reverse('posts:profile', args=[self.author.username]),
+                    reverse('posts:post_detail', args=[self.post.pk])):
+            with self.subTest(url=url):
+                response = Client().get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.get_profile(self.author).posts_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        """Пересчет исправляет разошедшиеся счетчики."""
+        Profile.objects.filter(user=self.author).update(posts_count=10)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=5)
+        drift = counters.reconcile()
+        self.assertEqual(drift['users.Profile'], 1)
+        self.assertEqual(drift['posts.Post'], 1)
+        self.assertEqual(self.get_profile(self.author).posts_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_counters_updated_with_write(self):
+        """Счетчик меняется на единицу в транзакции записи,
+        без пересчета и до выполнения задачи; одинаковые задачи
+        не дублируются."""
+        with CaptureQueriesContext(connection) as queries:
+            comment = Comment.objects.create(
+                text='Тестовый комментарий', author=self.user,
+                post=self.post)
+        comment.save()
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(Task.objects.filter(
+            name='posts.tasks.comment_changed').count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(drain(workers=1), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
@@ -0,0 +1,117 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from http import HTTPStatus
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import export
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Тестовое описание',
+            slug='test-slug',
+        )
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.staff = User.objects.create_user(
+            username='TestStaff', is_staff=True)
+        cls.old = Post.objects.create(text='Старый пост', author=cls.author)
+        cls.post = Post.objects.create(
+            text='Новый пост',
+            author=cls.author,
+            group=cls.group,
+        )
+        cls.watermark = cls.old.pk
+        Comment.objects.create(text='Комментарий', author=cls.user,
+                               post=cls.post)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def read(self, response):
+        content = b''.join(response.streaming_content)
+        if response['Content-Type'] == 'application/gzip':
+            content = gzip.decompress(content)
+        return content.decode()
+
+    def get(self, dataset, **params):
+        return self.staff_client.get(
+            reverse('posts:export', args=[dataset]), params)
+
+    def test_ndjson_rows(self):
+        """NDJSON содержит проекцию каждой записи по порядку id
+        с авторами и группами по username и slug."""
+        rows = [json.loads(line) for line in
+                self.read(self.get('posts')).splitlines()]
+        self.assertEqual([row['id'] for row in rows],
+                         [self.old.pk, self.post.pk])
+        self.assertEqual(rows[1]['author'], 'TestAuthor')
+        self.assertEqual(rows[1]['group'], 'test-slug')
+        self.assertIsNone(rows[0]['group'])
+        self.assertEqual(rows[1]['created'], self.post.created.isoformat())
+
+    def test_incremental_csv_gzip(self):
+        """Выгрузка от отметки содержит только более новые записи,
+        отметка для следующей выгрузки передается в заголовке."""
+        response = self.get('posts', format='csv', gzip='1',
+                            since=self.watermark)
+        rows = list(csv.reader(StringIO(self.read(response))))
+        self.assertEqual(rows[0], list(export.DATASETS['posts'][1]))
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.post.pk)])
+        watermark = response['X-Export-Watermark']
+        self.assertEqual(watermark, str(self.post.pk))
+        self.assertEqual(
+            self.read(self.get('posts', since=watermark)), '')
+        self.assertEqual(
+            self.get('posts', since='вчера').status_code,
+            HTTPStatus.BAD_REQUEST)
+
+    def test_export_is_staff_only(self):
+        """Выгрузка недоступна обычным пользователям,
+        неизвестный набор данных дает 404."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:export', args=['follows']))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(self.get('users').status_code, HTTPStatus.NOT_FOUND)
+
+    def test_export_command(self):
+        """Команда export пишет выгрузку в файл и сообщает отметку."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'follows.ndjson.gz')
+            stderr = StringIO()
+            call_command('export', 'follows', output=path, gzip=True,
+                         chunk_size=1, stderr=stderr)
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                rows = [json.loads(line) for line in file]
+        self.assertEqual(
+            [(row['user'], row['author']) for row in rows],
+            [('TestUser', 'TestAuthor')])
+        self.assertIn(f': {Follow.objects.get().pk}', stderr.getvalue())
+
+    def test_backdated_row_after_watermark(self):
+        """Запись, добавленная после выгрузки с датой в прошлом,
+        попадает в следующую выгрузку."""
+        watermark = self.get('posts')['X-Export-Watermark']
+        backdated = Post.objects.create(text='Импорт', author=self.author)
+        Post.objects.filter(pk=backdated.pk).update(
+            created=timezone.now() - timedelta(days=30))
+        rows = [json.loads(line) for line in
+                self.read(self.get('posts', since=watermark)).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [backdated.pk])
@@ -1,10 +1,12 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
 from ..forms import CommentForm, PostForm
 from ..models import Comment, Group, Post, User
@@ -97,6 +99,88 @@ class PostFormTests(TestCase):
             'posts:post_detail', kwargs={'post_id': self.post.id}))
         self.check_post_attributes(post, form_data['text'])
 
+    def test_edit_keeps_concurrent_counters(self):
+        """Правка поста не перезаписывает счетчик комментариев,
+        изменившийся после чтения поста."""
+        post = Post.objects.get(pk=self.post.pk)
+        Post.objects.filter(pk=post.pk).update(comments_count=3)
+        form = PostForm({'text': 'Новый текст'}, instance=post)
+        self.assertTrue(form.is_valid())
+        form.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 3)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIZE=(100, 100))
+class PostImageNormalizationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def make_photo(self):
+        """Снимок 400x200 с EXIF: поворот на 90 градусов и модель камеры."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x0110] = 'Test Camera'
+        content = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(
+            content, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile(
+            name='photo.jpeg',
+            content=content.getvalue(),
+            content_type='image/jpeg'
+        )
+
+    def test_uploaded_image_is_normalized(self):
+        """Загрузка уменьшается, поворачивается по EXIF
+        и сохраняется без метаданных, размеры записываются в пост
+        и выводятся на странице поста."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Тестовый текст', 'image': self.make_photo()},
+        )
+        post = Post.objects.latest('id')
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertFalse(image.getexif())
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, '50×100')
+
+    def test_admin_upload_is_normalized(self):
+        """Загрузка через админку проходит ту же нормализацию."""
+        admin = User.objects.create_superuser(
+            username='TestAdmin', email='admin@example.com', password='x')
+        self.authorized_client.force_login(admin)
+        self.authorized_client.post(
+            reverse('admin:posts_post_add'),
+            data={
+                'text': 'Тестовый текст',
+                'author': self.user.pk,
+                'image': self.make_photo(),
+                'comments_count': 0,
+            },
+        )
+        post = Post.objects.latest('id')
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 100))
+
 
 class CommentFormTests(TestCase):
     @classmethod
@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+
+from users.models import Profile
+
+from .. import importing, search
+from ..models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                      TimelineEntry, User)
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.user = User.objects.create_user(username='TestUser')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        for name in os.listdir(TEMP_DIR):
+            os.remove(os.path.join(TEMP_DIR, name))
+        self.path = os.path.join(TEMP_DIR, 'import.ndjson')
+        self.checkpoint = self.path + '.checkpoint'
+
+    def write(self, records):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            for record in records:
+                if not isinstance(record, str):
+                    record = json.dumps(record, ensure_ascii=False)
+                file.write(record + '\n')
+
+    def records(self):
+        return [
+            {'kind': 'group', 'slug': 'imported', 'title': 'Импорт',
+             'description': 'Группа из другой площадки'},
+            {'kind': 'post', 'id': 10, 'author': 'TestAuthor',
+             'group': 'imported', 'text': 'Перенесенный пост',
+             'created': '2021-05-01T10:00:00+00:00'},
+            {'kind': 'comment', 'post': 10, 'author': 'TestUser',
+             'text': 'Перенесенный комментарий'},
+            {'kind': 'post', 'id': 11, 'author': 'TestAuthor',
+             'text': 'Второй пост'},
+        ]
+
+    def test_import(self):
+        """Импорт создает группы, посты и комментарии с датами
+        из файла, счетчиками, лентами и поисковым индексом."""
+        self.write(self.records())
+        importer = importing.Importer(self.checkpoint, batch_size=3)
+        self.assertEqual(list(importer.run(self.path)), [3, 4])
+        group = Group.objects.get(slug='imported')
+        post = Post.objects.get(text='Перенесенный пост')
+        self.assertEqual(post.group, group)
+        self.assertEqual(post.created.isoformat(),
+                         '2021-05-01T10:00:00+00:00')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.get().post, post)
+        self.assertEqual(Profile.objects.get(user=self.author).posts_count, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2)
+        self.assertIn(post.pk, search.search_posts('комментарий'))
+
+    def test_invalid_rows_rejected(self):
+        """Строки с ошибками отклоняются с номером строки,
+        остальные строки пакета импортируются."""
+        self.write([
+            '{"kind": "po',
+            {'kind': 'post', 'author': 'Nobody', 'text': 'Текст'},
+            {'kind': 'post', 'author': 'TestAuthor', 'text': ''},
+            {'kind': 'post', 'author': 'TestAuthor', 'group': 'missing',
+             'text': 'Текст'},
+            {'kind': 'post', 'author': 'TestAuthor', 'text': 'Текст',
+             'created': 'вчера'},
+            {'kind': 'post', 'author': 'TestAuthor', 'text': 'Текст',
+             'created': '2020-13-01T00:00:00'},
+            {'kind': 'comment', 'post': 99, 'author': 'TestUser',
+             'text': 'Текст'},
+            {'kind': 'post', 'author': 'TestAuthor', 'text': 'Верный'},
+        ])
+        importer = importing.Importer()
+        errors = []
+        for _ in importer.run(self.path):
+            errors.extend(number for number, _ in importer.errors)
+        self.assertEqual(errors, [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(importer.stats['rejected'], 7)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Верный'])
+
+    def test_resume_from_checkpoint(self):
+        """Прерванный импорт продолжается со следующего пакета,
+        комментарии находят посты из уже импортированных пакетов."""
+        self.write(self.records())
+        next(importing.Importer(self.checkpoint, batch_size=2).run(
+            self.path))
+        self.assertEqual(Post.objects.count(), 1)
+        importer = importing.Importer(self.checkpoint, batch_size=2)
+        self.assertEqual(importer.line, 2)
+        list(importer.run(self.path))
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.get().post.text, 'Перенесенный пост')
+        list(importing.Importer(self.checkpoint).run(self.path))
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_failed_batch_rolls_back_checkpoint(self):
+        """Сбой в пакете откатывает и пакет, и отметку: повторный
+        запуск переносит пакет один раз."""
+        self.write(self.records())
+        importer = importing.Importer(self.checkpoint, batch_size=2)
+        with mock.patch.object(importing.Importer, 'import_comments',
+                               side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                list(importer.run(self.path))
+        self.assertEqual(ImportCheckpoint.objects.get().line, 0)
+        self.assertFalse(Post.objects.exists())
+        list(importing.Importer(self.checkpoint, batch_size=2).run(
+            self.path))
+        list(importing.Importer(self.checkpoint, batch_size=2).run(
+            self.path))
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_import_command(self):
+        """Команда import_posts сообщает о ходе и скорости импорта."""
+        self.write(self.records())
+        stdout = StringIO()
+        call_command('import_posts', self.path, stdout=stdout)
+        self.assertIn('постов: 2', stdout.getvalue())
+        self.assertIn('строк/с', stdout.getvalue())
+        self.assertEqual(
+            ImportCheckpoint.objects.get(name=self.path).line, 4)
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+POSTS_COUNT = 12
+
+
+class FeedQueryBudgetTests(TestCase):
+    """Количество запросов к БД на страницу не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовое описание',
+            slug='test-slug',
+        )
+        cls.reader = User.objects.create_user(username='TestReader')
+        cls.authors = [
+            User.objects.create_user(
+                username=f'TestAuthor{i}',
+                first_name='Имя',
+                last_name=f'Фамилия {i}',
+            )
+            for i in range(3)
+        ]
+        for i in range(POSTS_COUNT):
+            post = Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=cls.authors[i % len(cls.authors)],
+                group=cls.group,
+            )
+            Comment.objects.create(
+                text=f'Тестовый комментарий {i}',
+                author=cls.authors[(i + 1) % len(cls.authors)],
+                post=post,
+            )
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.post = post
+        cls.QUERY_BUDGETS = (
+            ('posts:index', None, 4),
+            ('posts:group_list', [cls.group.slug], 5),
+            ('posts:profile', [cls.authors[0].username], 6),
+            ('posts:post_detail', [cls.post.id], 5),
+            ('posts:post_comments', [cls.post.id], 2),
+            ('posts:follow_index', None, 5),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_views_query_budget(self):
+        """Страницы лент укладываются в бюджет запросов."""
+        for address, args, budget in self.QUERY_BUDGETS:
+            with self.subTest(address=address):
+                with self.assertNumQueries(budget):
+                    self.authorized_client.get(reverse(address, args=args))
@@ -0,0 +1,70 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestAuthor')
+
+    def setUp(self):
+        self.client = Client()
+
+    def create_posts(self):
+        self.books = Post.objects.create(
+            text='Читаю новые книги о путешествиях',
+            author=self.user,
+        )
+        self.cats = Post.objects.create(
+            text='Мой кот любит спать',
+            author=self.user,
+        )
+        Comment.objects.create(
+            text='А я люблю старые книги',
+            author=self.user,
+            post=self.cats,
+        )
+
+    def test_stemming(self):
+        """Разные формы слова приводятся к одной основе."""
+        self.assertEqual(search.stem('книгами'), search.stem('книги'))
+        self.assertEqual(search.analyze('Котов и кот'), ['кот', 'кот'])
+
+    def check_search(self):
+        self.create_posts()
+        self.assertEqual(search.search_posts('книгами'),
+                         [self.books.id, self.cats.id])
+        self.assertEqual(search.search_posts('котами'), [self.cats.id])
+        self.assertEqual(search.search_posts('книга путешествие'),
+                         [self.books.id])
+        self.books.delete()
+        self.assertEqual(search.search_posts('книги'), [self.cats.id])
+
+    def test_fts5_search(self):
+        """Поиск по FTS5 учитывает комментарии и удаление постов."""
+        self.assertIsInstance(search.get_backend(), search.Fts5Backend)
+        self.check_search()
+
+    @override_settings(SEARCH_BACKEND='inverted')
+    def test_inverted_index_search(self):
+        """Запасной инвертированный индекс дает те же результаты."""
+        self.check_search()
+
+    @override_settings(SEARCH_BACKEND='inverted')
+    def test_inverted_index_limit(self):
+        """Ограничение применяется после ранжирования."""
+        Post.objects.create(text='Кот', author=self.user)
+        cats = Post.objects.create(text='Кот кот кот', author=self.user)
+        self.assertEqual(search.search_posts('кот', limit=1), [cats.id])
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные посты."""
+        self.create_posts()
+        response = self.client.get(reverse('posts:search'), {'q': 'кошки'})
+        self.assertEqual(list(response.context['page_obj']), [])
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        self.assertEqual(list(response.context['page_obj']), [self.cats])
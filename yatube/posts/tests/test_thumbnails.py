@@ -0,0 +1,138 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from core.models import Task
+from core.tasks import process_task
+
+from .. import thumbnails
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self):
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Тестовый текст',
+                'image': SimpleUploadedFile(
+                    name='small.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            },
+        )
+        return Post.objects.latest('id')
+
+    @override_settings(TASKS_EAGER=False)
+    def test_create_post_enqueues_job(self):
+        """Публикация поста с картинкой ставит задачу в очередь,
+        а страница выводит заглушку вместо миниатюры."""
+        post = self.create_post()
+        self.assertFalse(post.thumbnails_ready)
+        self.assertTrue(Task.objects.filter(
+            name='posts.tasks.generate_thumbnails',
+            key=f'thumbnails:{post.pk}', status=Task.PENDING).exists())
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=[post.id]))
+        self.assertContains(response, 'Изображение обрабатывается')
+
+    @override_settings(TASKS_EAGER=False)
+    def test_admin_upload_enqueues_job(self):
+        """Пост с картинкой, сохраненный в админке, тоже получает
+        задачу миниатюр; правка без смены картинки ее не ставит."""
+        admin = User.objects.create_superuser(
+            username='TestAdmin', email='admin@example.com', password='x')
+        self.authorized_client.force_login(admin)
+        self.authorized_client.post(
+            reverse('admin:posts_post_add'),
+            data={
+                'text': 'Тестовый текст',
+                'author': self.user.pk,
+                'image': SimpleUploadedFile(
+                    name='small.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+                'comments_count': 0,
+            },
+        )
+        post = Post.objects.latest('id')
+        job = Task.objects.get(
+            name='posts.tasks.generate_thumbnails',
+            key=f'thumbnails:{post.pk}')
+        self.assertTrue(process_task(job.pk))
+        post = Post.objects.get(pk=post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertFalse(Task.objects.filter(
+            name='posts.tasks.generate_thumbnails').exists())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_process_job_marks_post_ready(self):
+        """Выполненная задача открывает вывод миниатюры."""
+        post = self.create_post()
+        job = Task.objects.get(key=f'thumbnails:{post.pk}')
+        self.assertTrue(process_task(job.pk))
+        self.assertFalse(process_task(job.pk))
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        self.assertFalse(Task.objects.filter(pk=job.pk).exists())
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=[post.id]))
+        self.assertNotContains(response, 'Изображение обрабатывается')
+
+    def test_ready_image_has_srcset(self):
+        """Готовое изображение выводится со всеми вариантами в srcset."""
+        self.create_post()
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertContains(response, 'loading="lazy"')
+        for width in thumbnails.VARIANT_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w')
+
+    def test_ready_variants_match_generated(self):
+        """Варианты для вывода совпадают с подготовленными файлами
+        и вычисляются без обращений к базе."""
+        post = self.create_post()
+        generated = thumbnails.get_variants(post.image)
+        with self.assertNumQueries(0):
+            ready = thumbnails.get_ready_variants(post.image)
+        for image_format, variants in generated.items():
+            with self.subTest(image_format=image_format):
+                self.assertEqual(
+                    [(variant.url, variant.size) for variant in variants],
+                    [(variant.url, variant.size)
+                     for variant in ready[image_format]])
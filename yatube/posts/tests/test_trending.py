@@ -0,0 +1,137 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Task
+
+from .. import trending
+from ..models import Comment, Follow, Group, Post, User
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Тестовое описание',
+            slug='test-slug',
+        )
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.quiet = Post.objects.create(
+            text='Тихий пост',
+            author=cls.author,
+        )
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def comment(self, post, count=1, created=None):
+        for _ in range(count):
+            comment = Comment.objects.create(
+                text='Комментарий', author=self.user, post=post)
+            if created is not None:
+                Comment.objects.filter(pk=comment.pk).update(created=created)
+
+    def test_fresh_events_weigh_more(self):
+        """Оценка затухает: один свежий комментарий весит больше,
+        чем один двухдневной давности, но меньше пяти таких."""
+        now = timezone.now()
+        fresh = trending.event_score(now, trending.COMMENT_WEIGHT)
+        old = trending.event_score(
+            now - 2 * trending.HALF_LIFE, trending.COMMENT_WEIGHT)
+        self.assertGreater(fresh, old)
+        five_old = old
+        for _ in range(4):
+            five_old = trending.add_score(five_old, old)
+        self.assertGreater(five_old, fresh)
+
+    def test_rebuild_orders_by_score(self):
+        """Перестройка учитывает комментарии и подписки за WINDOW,
+        более старые события не учитываются."""
+        self.comment(self.quiet, 2)
+        self.comment(self.post)
+        self.assertEqual(trending.rebuild(), 3)
+        self.assertEqual(trending.get_top(), [self.quiet.pk, self.post.pk])
+        Follow.objects.create(user=self.author, author=self.user)
+        trending.rebuild()
+        self.assertEqual(trending.get_top(), [self.post.pk, self.quiet.pk])
+        self.assertEqual(
+            trending.get_top(trending.group_scope(self.group.pk)),
+            [self.post.pk])
+        Comment.objects.update(
+            created=timezone.now() - trending.WINDOW - timedelta(days=1))
+        Follow.objects.all().delete()
+        self.assertEqual(trending.rebuild(), 0)
+        self.assertEqual(trending.get_top(), [])
+
+    def test_comments_update_top_incrementally(self):
+        """Новые комментарии и подписки обновляют построенный топ
+        без перестройки; непостроенный топ не создается."""
+        self.comment(self.quiet)
+        self.assertIsNone(trending.get_top())
+        trending.rebuild()
+        self.comment(self.post, 2)
+        self.assertEqual(trending.get_top(), [self.post.pk, self.quiet.pk])
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(trending.get_top(), [self.quiet.pk, self.post.pk])
+
+    def test_popular_pages(self):
+        """Популярное сайта и группы выводится из топа в кеше."""
+        self.comment(self.post)
+        trending.rebuild()
+        response = self.guest_client.get(reverse('posts:popular'))
+        self.assertTemplateUsed(response, 'posts/popular.html')
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        response = self.guest_client.get(
+            reverse('posts:group_popular', args=[self.group.slug]))
+        self.assertEqual(response.context['group'], self.group)
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+    @override_settings(TASKS_EAGER=False)
+    def test_missing_top_is_rebuilt_in_background(self):
+        """Без построенного топа страница пуста, а перестройка
+        ставится в очередь один раз."""
+        self.comment(self.post)
+        for _ in range(2):
+            response = self.guest_client.get(reverse('posts:popular'))
+            self.assertEqual(list(response.context['page_obj']), [])
+        self.assertEqual(Task.objects.filter(
+            name='posts.tasks.rebuild_trending').count(), 1)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_new_group_does_not_trigger_rebuild(self):
+        """Страница группы, созданной после перестройки, не ставит
+        перестройку, а ее топ пополняется новыми событиями."""
+        trending.rebuild()
+        group = Group.objects.create(
+            title='Новая группа', slug='new-group', description='')
+        url = reverse('posts:group_popular', args=[group.slug])
+        response = self.guest_client.get(url)
+        self.assertEqual(list(response.context['page_obj']), [])
+        self.assertFalse(Task.objects.filter(
+            name='posts.tasks.rebuild_trending').exists())
+        post = Post.objects.create(
+            text='Пост новой группы', author=self.author, group=group)
+        trending.record_comments([Comment.objects.create(
+            text='Комментарий', author=self.user, post=post)])
+        self.assertEqual(
+            trending.get_top(trending.group_scope(group.pk)), [post.pk])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_trending строит топы."""
+        self.comment(self.post)
+        call_command('rebuild_trending', stdout=StringIO())
+        self.assertEqual(trending.get_top(), [self.post.pk])
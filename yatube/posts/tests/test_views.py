@@ -1,14 +1,19 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.middleware.csrf import _get_new_csrf_token as get_new_csrf_token
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
-from ..models import Follow, Group, Post, User
+from .. import caching, timeline
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+from ..utils import (COMMENTS_PAGE_SIZE, CURSOR_NEXT, PAGE_SIZE,
+                     encode_cursor)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -155,26 +160,129 @@ class PostPagesTests(TestCase):
         )
         main_page = self.MAIN_PAGE_URL[0]
 
-        content_before_delete = self.authorized_client.get(
+        content_before_update = self.authorized_client.get(
             reverse(main_page)).content
 
-        form_data.delete()
+        Post.objects.filter(pk=form_data.pk).update(text='Без сигналов')
 
-        content_after_delete = self.authorized_client.get(
+        content_after_update = self.authorized_client.get(
             reverse(main_page)).content
 
-        cache.clear()
+        form_data.delete()
 
-        content_after_cache_clear = self.authorized_client.get(
+        content_after_delete = self.authorized_client.get(
             reverse(main_page)).content
 
         self.assertEqual(
-            content_before_delete, content_after_delete
+            content_before_update, content_after_update
         )
         self.assertNotEqual(
-            content_before_delete, content_after_cache_clear
+            content_before_update, content_after_delete
         )
 
+    def test_cache_invalidated_on_writes(self):
+        """Запись поста сразу сбрасывает кеш страниц, где он выводится."""
+        cached_pages = (
+            self.MAIN_PAGE_URL, self.FIRST_GROUP_URL, self.PROFILE_URL)
+        for address, args, _ in cached_pages:
+            self.authorized_client.get(reverse(address, args=args))
+        Post.objects.create(
+            text='Свежий пост',
+            group=self.group_1,
+            author=self.user,
+        )
+        for address, args, _ in cached_pages:
+            with self.subTest(address=address):
+                self.assertContains(
+                    self.authorized_client.get(reverse(address, args=args)),
+                    'Свежий пост')
+
+    @override_settings(REPLICA_DATABASES=['default'])
+    def test_replica_read_not_cached_after_write(self):
+        """Страница из реплики сразу после изменения области
+        не кешируется, позже - кешируется как обычно."""
+        url = reverse(self.MAIN_PAGE_URL[0])
+        self.authorized_client.get(url)
+        Post.objects.bulk_create([Post(text='Первый пост', author=self.user)])
+        self.assertContains(self.authorized_client.get(url), 'Первый пост')
+        with mock.patch.object(caching, 'PIN_SECONDS', 0):
+            self.authorized_client.get(url)
+            Post.objects.bulk_create([
+                Post(text='Второй пост', author=self.user)])
+            self.assertNotContains(
+                self.authorized_client.get(url), 'Второй пост')
+
+    def test_post_card_fragment_cache(self):
+        """Карточка поста кешируется до изменения поста
+        и переиспользуется на разных страницах."""
+        group_url = reverse(self.FIRST_GROUP_URL[0],
+                            args=self.FIRST_GROUP_URL[1])
+        profile_url = reverse(self.PROFILE_URL[0], args=self.PROFILE_URL[1])
+        self.authorized_client.get(group_url)
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        self.assertContains(
+            self.authorized_client.get(profile_url), self.post.text)
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        self.assertContains(
+            self.authorized_client.get(profile_url), 'Новый текст')
+
+    def test_conditional_get(self):
+        """Неизменившаяся страница отдается как 304,
+        а новый комментарий меняет ее ETag."""
+        guest_client = Client()
+        pages = (*self.EXPECTED_PAGES_URLS, self.DETAIL_URL)
+        for address, args, _ in pages:
+            with self.subTest(address=address):
+                url = reverse(address, args=args)
+                response = guest_client.get(url)
+                etag = response['ETag']
+                self.assertIn('Last-Modified', response)
+                response = guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                Comment.objects.create(
+                    text='Тестовый комментарий',
+                    author=self.user,
+                    post=self.post,
+                )
+                response = guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_feed_pages_revalidated_by_browser(self):
+        """Страницы лент и поста кешируются только на сервере:
+        браузер перепроверяет их при каждом показе."""
+        pages = (*self.EXPECTED_PAGES_URLS, self.DETAIL_URL)
+        for client in (Client(), self.authorized_client):
+            for address, args, _ in pages:
+                with self.subTest(address=address):
+                    for _ in range(2):
+                        response = client.get(reverse(address, args=args))
+                        self.assertEqual(
+                            response['Cache-Control'], 'private, no-cache')
+                        self.assertFalse(response.has_header('Expires'))
+
+    def test_conditional_get_depends_on_user(self):
+        """ETag гостя не подходит авторизованному пользователю,
+        которому Last-Modified не отдается."""
+        url = reverse(self.MAIN_PAGE_URL[0])
+        etag = Client().get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_conditional_get_depends_on_csrf_secret(self):
+        """Страница поста с формой комментария не отдается как 304,
+        если секрет CSRF сменился, например после повторного входа."""
+        url = reverse(self.DETAIL_URL[0], args=self.DETAIL_URL[1])
+        self.authorized_client.get(url)
+        etag = self.authorized_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.authorized_client.cookies[settings.CSRF_COOKIE_NAME] = (
+            get_new_csrf_token())
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -224,6 +332,136 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['page_obj']), 3)
 
 
+@override_settings(POSTS_CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(PaginatorViewsTest):
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def get_page(self, url, args, cursor=''):
+        return self.authorized_client.get(
+            reverse(url, args=args), {'cursor': cursor}
+        ).context['page_obj']
+
+    def test_second_page_contains_three_records(self):
+        """Курсор следующей страницы ведет на оставшиеся записи."""
+        for url, args in self.PAGE_WITH_PAGINATION:
+            with self.subTest(url=url):
+                first_page = self.get_page(url, args)
+                second_page = self.get_page(url, args, first_page.next_cursor)
+                self.assertEqual(len(second_page), 3)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор предыдущей страницы возвращает ту же первую страницу."""
+        for url, args in self.PAGE_WITH_PAGINATION:
+            with self.subTest(url=url):
+                first_page = self.get_page(url, args)
+                second_page = self.get_page(url, args, first_page.next_cursor)
+                previous_page = self.get_page(
+                    url, args, second_page.previous_cursor)
+                self.assertEqual(
+                    list(previous_page), list(first_page))
+                self.assertFalse(previous_page.has_previous())
+
+    def test_cursor_past_last_row(self):
+        """Курсор за последней записью дает пустую страницу
+        со ссылкой только на начало ленты."""
+        oldest = Post.objects.order_by('created', 'pk').first()
+        cursor = encode_cursor(CURSOR_NEXT, oldest.created, oldest.pk)
+        for url, args in self.PAGE_WITH_PAGINATION:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(
+                    reverse(url, args=args), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page_obj']
+                self.assertEqual(len(page), 0)
+                self.assertFalse(page.has_next())
+                self.assertTrue(page.has_previous())
+                self.assertIsNone(page.previous_cursor)
+                self.assertIsNone(page.next_cursor)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Поврежденный курсор не ломает страницу."""
+        for url, args in self.PAGE_WITH_PAGINATION:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    len(self.get_page(url, args, 'broken')), 10)
+
+
+class CommentPaginationViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestAuthor')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        for i in range(COMMENTS_PAGE_SIZE + 5):
+            Comment.objects.create(
+                text=f'Тестовый комментарий {i}',
+                author=cls.user,
+                post=cls.post,
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_post_detail_shows_first_comments_page(self):
+        """На странице поста выводится только первая страница комментариев."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PAGE_SIZE)
+        self.assertTrue(comments.has_next())
+        self.assertContains(
+            response, reverse('posts:post_comments', args=[self.post.id]))
+
+    def test_comments_fragment_returns_older_comments(self):
+        """Фрагмент по курсору содержит оставшиеся ранние комментарии."""
+        first_page = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        ).context['comments']
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=[self.post.id]),
+            {'cursor': first_page.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertFalse(response.context['comments'].has_next())
+        self.assertContains(response, 'Тестовый комментарий 0')
+
+    def test_comments_json(self):
+        """Комментарии отдаются в JSON вместе с курсором продолжения."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=[self.post.id]),
+            {'format': 'json'})
+        data = response.json()
+        self.assertEqual(len(data['comments']), COMMENTS_PAGE_SIZE)
+        self.assertEqual(data['comments'][0]['author'], self.user.username)
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_comments_cursor_past_last_row(self):
+        """Курсор за самым ранним комментарием не ломает страницу
+        поста и подгрузку комментариев."""
+        oldest = Comment.objects.order_by('created', 'pk').first()
+        cursor = encode_cursor(CURSOR_NEXT, oldest.created, oldest.pk)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.id]),
+            {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=[self.post.id]),
+            {'format': 'json', 'cursor': cursor})
+        self.assertEqual(response.json(),
+                         {'comments': [], 'next_cursor': None})
+
+    def test_comments_for_missing_post(self):
+        """Для несуществующего поста возвращается 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=[self.post.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
 class FollowViewsTest(TestCase):
 
     @classmethod
@@ -309,3 +547,70 @@ class FollowViewsTest(TestCase):
             reverse(self.MAIN_PAGE_URL)
         )
         self.assertNotIn(new_post, response.context['page_obj'].object_list)
+
+    def test_follow_backfills_timeline(self):
+        """После подписки в ленте появляются уже опубликованные посты."""
+        old_post = Post.objects.create(
+            text='Старый тестовый текст',
+            author=self.follower
+        )
+        profile_follow, args = self.PROFILE_FOLLOW_URL
+        self.authorized_client.get(reverse(profile_follow, args=args))
+        response = self.authorized_client.get(reverse(self.MAIN_PAGE_URL))
+        self.assertIn(old_post, response.context['page_obj'].object_list)
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки посты автора пропадают из ленты."""
+        post = Post.objects.create(
+            text='Новый тестовый текст',
+            author=self.not_follower
+        )
+        profile_unfollow, args = self.PROFILE_UNFOLLOW_URL
+        self.authorized_follower.get(reverse(profile_unfollow, args=args))
+        response = self.authorized_follower.get(reverse(self.MAIN_PAGE_URL))
+        self.assertNotIn(post, response.context['page_obj'].object_list)
+
+    @mock.patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 0)
+    def test_prolific_author_read_on_demand(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        post = Post.objects.create(
+            text='Новый тестовый текст',
+            author=self.not_follower
+        )
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_follower.get(reverse(self.MAIN_PAGE_URL))
+        self.assertIn(post, response.context['page_obj'].object_list)
+
+    def test_author_below_threshold_backfilled(self):
+        """Когда автор перестает быть популярным, его посты
+        за популярный период появляются в лентах подписчиков."""
+        with mock.patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 0):
+            timeline.sync_fanout(self.not_follower.pk)
+            post = Post.objects.create(
+                text='Пост популярного автора',
+                author=self.not_follower
+            )
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        timeline.sync_fanout(self.not_follower.pk)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=post).exists())
+
+    @mock.patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 1)
+    def test_follow_feed_merges_pulled_posts(self):
+        """Лента из материализованных записей и постов популярного
+        автора листается курсором без пропусков и повторов."""
+        Follow.objects.create(user=self.user, author=self.not_follower)
+        Follow.objects.create(user=self.follower, author=self.user)
+        for number in range(PAGE_SIZE + 3):
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=(self.user, self.not_follower)[number % 2],
+            )
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.authorized_follower.get(
+                reverse(self.MAIN_PAGE_URL), {'cursor': cursor})
+            seen.extend(response.context['page_obj'])
+            cursor = response.context['page_obj'].next_cursor
+        self.assertEqual(seen, list(Post.objects.order_by('-created', '-pk')))
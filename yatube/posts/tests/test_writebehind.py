@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from users.models import Profile
+
+from .. import search, writebehind
+from ..models import Comment, Follow, Post, TimelineEntry, User
+
+TEMP_QUEUE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(WRITE_BEHIND=True, WRITE_BEHIND_DIR=TEMP_QUEUE_DIR)
+class WriteBehindTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.author,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_QUEUE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        for name in os.listdir(TEMP_QUEUE_DIR):
+            os.remove(os.path.join(TEMP_QUEUE_DIR, name))
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+
+    def comment(self, text):
+        return self.user_client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': text})
+
+    def test_comment_is_queued(self):
+        """Комментарий попадает в очередь, а не в базу,
+        и виден автору до разбора очереди."""
+        self.comment('Ожидающий комментарий')
+        self.assertFalse(Comment.objects.exists())
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.user_client.get(detail)
+        self.assertContains(response, 'Ожидающий комментарий')
+        self.assertContains(response, 'ожидает публикации')
+        self.assertNotContains(Client().get(detail), 'Ожидающий комментарий')
+
+    def test_flush_comments(self):
+        """Разбор очереди создает комментарии, обновляет счетчик,
+        поисковый индекс и снимает метки ожидания."""
+        self.comment('Первый комментарий')
+        self.comment('Второй комментарий')
+        self.assertEqual(writebehind.flush(), 2)
+        comments = Comment.objects.order_by('created')
+        self.assertEqual([comment.text for comment in comments],
+                         ['Первый комментарий', 'Второй комментарий'])
+        self.assertEqual(comments[0].author, self.user)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertIn(self.post.pk, search.search_posts('второй'))
+        self.assertEqual(
+            writebehind.get_pending_comments(self.post.pk, self.user), [])
+        self.assertEqual(writebehind.flush(), 0)
+
+    def test_replayed_batch_applied_once(self):
+        """Пакет, повторно разобранный после сбоя между фиксацией
+        и удалением файла, не создает дублей и не меняет счетчики."""
+        self.comment('Первый комментарий')
+        self.comment('Второй комментарий')
+        records = writebehind.read_batch(writebehind.rotate())
+        writebehind.apply(records)
+        writebehind.apply(records)
+        self.assertEqual(Comment.objects.count(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+    def test_follow_is_queued(self):
+        """Подписка видна в профиле сразу и создается разбором очереди
+        вместе со счетчиками и лентой."""
+        profile = reverse('posts:profile', args=[self.author.username])
+        self.user_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertFalse(Follow.objects.exists())
+        self.assertContains(self.user_client.get(profile), 'Отписаться')
+        writebehind.flush()
+        self.assertTrue(Follow.objects.filter(
+            user=self.user, author=self.author).exists())
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+        self.assertContains(self.user_client.get(profile), 'Отписаться')
+
+    def test_last_follow_action_wins(self):
+        """Подписка и отписка в одном пакете не создают подписку,
+        отписка от существующей подписки удаляет ее."""
+        self.user_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.user_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        writebehind.flush()
+        self.assertFalse(Follow.objects.exists())
+        Follow.objects.create(user=self.user, author=self.author)
+        self.user_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        writebehind.flush()
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 0)
+
+    def test_rotated_queue_gets_new_records(self):
+        """Записи после переименования очереди попадают в новый файл,
+        поврежденная строка пакета пропускается."""
+        writebehind.enqueue_comment(self.post, self.user, 'В пакете')
+        batch = writebehind.rotate()
+        writebehind.enqueue_comment(self.post, self.user, 'В очереди')
+        with open(batch, 'a') as file:
+            file.write('{"kind": "comm')
+        self.assertEqual(
+            [record['text'] for record in writebehind.read_batch(batch)],
+            ['В пакете'])
+        self.assertEqual(writebehind.flush(), 2)
+        self.assertEqual(Comment.objects.count(), 2)
@@ -0,0 +1,84 @@
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+# Реестр вариантов изображения карточки поста: ширины для srcset
+# при пропорциях 960x339 и форматы в порядке предпочтения.
+VARIANT_WIDTHS = (320, 640, 960)
+VARIANT_RATIO = (960, 339)
+VARIANT_FORMATS = ('WEBP', 'JPEG')
+VARIANT_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def get_formats():
+    """Форматы вариантов, которые поддерживает установленный Pillow."""
+    return tuple(image_format for image_format in VARIANT_FORMATS
+                 if image_format != 'WEBP' or features.check('webp'))
+
+
+def get_size(width):
+    ratio_width, ratio_height = VARIANT_RATIO
+    return width, round(width * ratio_height / ratio_width)
+
+
+def get_geometry(width):
+    return '{}x{}'.format(*get_size(width))
+
+
+def get_options(image_format):
+    """Параметры варианта, дополненные так же, как их дополняет
+    get_thumbnail: от них зависит имя файла варианта."""
+    backend = default.backend
+    options = {'format': image_format, **VARIANT_OPTIONS}
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def get_variants(image):
+    """Варианты изображения, сгруппированные по формату.
+
+    Для готового изображения sorl-thumbnail берет данные
+    из key-value хранилища и не открывает файлы.
+    """
+    return {
+        image_format: [
+            get_thumbnail(image, get_geometry(width), format=image_format,
+                          **VARIANT_OPTIONS)
+            for width in VARIANT_WIDTHS
+        ]
+        for image_format in get_formats()
+    }
+
+
+def get_ready_variants(image):
+    """Варианты уже подготовленного изображения без обращений
+    к key-value хранилищу: имя файла вычисляется так же, как при
+    генерации, размер известен из геометрии реестра (crop и upscale
+    дают ровно ее). Страница с карточками не делает запрос на каждый
+    вариант, даже если кеш хранилища пуст.
+    """
+    source = ImageFile(image)
+    variants = {}
+    for image_format in get_formats():
+        options = get_options(image_format)
+        variants[image_format] = []
+        for width in VARIANT_WIDTHS:
+            variant = ImageFile(
+                default.backend._get_thumbnail_filename(
+                    source, get_geometry(width), options),
+                default.storage)
+            variant.set_size(get_size(width))
+            variants[image_format].append(variant)
+    return variants
+
+
+def generate(post):
+    """Подготовка всех вариантов изображения поста."""
+    get_variants(post.image)
@@ -0,0 +1,213 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from users.models import Profile
+
+from .models import Follow, Post, TimelineEntry
+from .utils import get_ordered, paginate_cursor
+
+# Авторы, у которых подписчиков больше этого порога, не раскладываются
+# по лентам при публикации: их посты подмешиваются при чтении.
+FANOUT_MAX_FOLLOWERS: int = 1000
+# Сколько последних постов автора попадает в ленту при подписке.
+BACKFILL_SIZE: int = 200
+
+
+def _entries(user_ids, posts):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            created=created,
+        )
+        for user_id in user_ids
+        for post_id, author_id, created in posts
+    ]
+
+
+def is_prolific(author_id):
+    """Автор с большим числом подписчиков читается fan-out on read."""
+    return Profile.objects.filter(
+        user_id=author_id,
+        followers_count__gt=FANOUT_MAX_FOLLOWERS,
+    ).exists()
+
+
+def fan_out_post(post):
+    """Раскладка нового поста по лентам подписчиков автора."""
+    if is_prolific(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        _entries(followers, [(post.pk, post.author_id, post.created)]),
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_posts(posts):
+    """Раскладка пакета постов по лентам подписчиков их авторов
+    тремя запросами на весь пакет, например при импорте."""
+    author_ids = {post.author_id for post in posts}
+    prolific = set(Profile.objects.filter(
+        user_id__in=author_ids,
+        followers_count__gt=FANOUT_MAX_FOLLOWERS,
+    ).values_list('user_id', flat=True))
+    followers = defaultdict(list)
+    for user_id, author_id in Follow.objects.filter(
+            author_id__in=author_ids - prolific).values_list(
+            'user_id', 'author_id'):
+        followers[author_id].append(user_id)
+    TimelineEntry.objects.bulk_create([
+        entry for post in posts
+        for entry in _entries(followers[post.author_id],
+                              [(post.pk, post.author_id, post.created)])
+    ], ignore_conflicts=True)
+
+
+def backfill(follow):
+    """Заполнение ленты последними постами автора после подписки."""
+    if is_prolific(follow.author_id):
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).order_by(
+        '-created').values_list('pk', 'author_id', 'created')[:BACKFILL_SIZE]
+    TimelineEntry.objects.bulk_create(
+        _entries([follow.user_id], posts), ignore_conflicts=True)
+
+
+def prune(follow):
+    """Удаление постов автора из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id).delete()
+
+
+def get_pull_authors(user):
+    """Популярные авторы из подписок пользователя."""
+    return list(Follow.objects.filter(
+        user=user,
+        author__profile__followers_count__gt=FANOUT_MAX_FOLLOWERS,
+    ).values_list('author_id', flat=True))
+
+
+class FollowFeed:
+    """Лента подписок пользователя.
+
+    Страница выбирается по индексу (user, -created, -post)
+    материализованной ленты вместе с постами (select_related).
+    Посты популярных авторов выбираются при чтении по индексу
+    (author, -created) и сливаются с лентой по тому же ключу;
+    их записи в ленте, оставшиеся с тех пор, когда автор не был
+    популярным, пропускаются. Поддерживает Paginator (count
+    и срезы) и курсорную паджинацию (get_cursor_page).
+    """
+
+    def __init__(self, user):
+        pull_authors = get_pull_authors(user)
+        self.entries = TimelineEntry.objects.filter(user=user)
+        self.pulled = None
+        if pull_authors:
+            self.entries = self.entries.exclude(author_id__in=pull_authors)
+            self.pulled = Post.objects.filter(author_id__in=pull_authors)
+
+    def get_querysets(self):
+        """Источники ленты и поле второго ключа сортировки."""
+        querysets = [(self.entries, 'post_id')]
+        if self.pulled is not None:
+            querysets.append((self.pulled, 'pk'))
+        return querysets
+
+    def get_posts(self, limit, offset=0, after=None, ascending=False):
+        entries = get_ordered(self.entries.select_related(
+            'post__author', 'post__group'), 'post_id', after, ascending)
+        if self.pulled is None:
+            return [entry.post for entry in entries[offset:limit]]
+        rows = [(entry.created, entry.post_id, entry.post)
+                for entry in entries[:limit]]
+        rows.extend(
+            (post.created, post.pk, post) for post in get_ordered(
+                self.pulled.select_related('author', 'group'), 'pk',
+                after, ascending)[:limit])
+        rows.sort(key=lambda row: row[:2], reverse=not ascending)
+        return [post for _, _, post in rows[offset:limit]]
+
+    def count(self):
+        return sum(queryset.count() for queryset, _ in self.get_querysets())
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        return self.get_posts(index.stop, index.start or 0)
+
+    def get_cursor_page(self, token, page_size):
+        """Страница от позиции курсора, как utils.get_cursor_page."""
+        return paginate_cursor(self.get_posts, token, page_size)
+
+
+def get_follow_feed(user):
+    return FollowFeed(user)
+
+
+def sync_fanout(author_id):
+    """Смена режима раскладки постов автора по числу подписчиков.
+
+    Пока автор популярен, его посты не раскладываются по лентам.
+    Когда подписчиков становится не больше FANOUT_MAX_FOLLOWERS,
+    последние посты автора раскладываются по лентам всех его
+    подписчиков, иначе посты за популярный период из лент пропали бы.
+    """
+    row = Profile.objects.filter(user_id=author_id).values_list(
+        'followers_count', 'fanout_pull').first()
+    if row is None:
+        return
+    followers_count, pulled = row
+    prolific = followers_count > FANOUT_MAX_FOLLOWERS
+    if prolific == pulled:
+        return
+    changed = Profile.objects.filter(
+        user_id=author_id, fanout_pull=pulled).update(fanout_pull=prolific)
+    if changed and not prolific:
+        posts = Post.objects.filter(author_id=author_id).order_by(
+            '-created').values_list(
+                'pk', 'author_id', 'created')[:BACKFILL_SIZE]
+        followers = Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True)
+        TimelineEntry.objects.bulk_create(
+            _entries(followers, posts), ignore_conflicts=True)
+
+
+@transaction.atomic
+def rebuild(users=None):
+    """Полная перестройка лент, например после массовой загрузки данных.
+
+    Подписки группируются по авторам: последние посты каждого автора
+    выбираются один раз и раскладываются сразу всем его подписчикам.
+    """
+    follows = Follow.objects.all()
+    entries = TimelineEntry.objects.all()
+    if users is not None:
+        follows = follows.filter(user__in=users)
+        entries = entries.filter(user__in=users)
+    entries.delete()
+    if users is None:
+        Profile.objects.filter(
+            followers_count__gt=FANOUT_MAX_FOLLOWERS).update(fanout_pull=True)
+        Profile.objects.filter(
+            followers_count__lte=FANOUT_MAX_FOLLOWERS).update(
+            fanout_pull=False)
+    followers = defaultdict(list)
+    for user_id, author_id in follows.values_list(
+            'user_id', 'author_id').iterator():
+        followers[author_id].append(user_id)
+    prolific = set(Profile.objects.filter(
+        followers_count__gt=FANOUT_MAX_FOLLOWERS
+    ).values_list('user_id', flat=True))
+    for author_id, user_ids in followers.items():
+        if author_id in prolific:
+            continue
+        posts = Post.objects.filter(author_id=author_id).order_by(
+            '-created').values_list(
+                'pk', 'author_id', 'created')[:BACKFILL_SIZE]
+        TimelineEntry.objects.bulk_create(
+            _entries(user_ids, posts), ignore_conflicts=True)
@@ -0,0 +1,176 @@
+import math
+from datetime import datetime, timedelta
+from itertools import chain
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post
+
+# Период полураспада веса события: через сутки комментарий
+# весит вдвое меньше свежего.
+HALF_LIFE: timedelta = timedelta(hours=24)
+DECAY: float = math.log(2) / HALF_LIFE.total_seconds()
+# Точка отсчета оценок. Оценка хранится как логарифм суммы весов,
+# умноженных на exp(DECAY * (t - EPOCH)): затухание общее для всех
+# постов, поэтому порядок по такой оценке совпадает с порядком
+# по текущему затухшему весу, а пересчитывать оценки со временем
+# не нужно. Логарифм не дает экспоненте переполниться.
+EPOCH: datetime = datetime(2020, 1, 1, tzinfo=timezone.utc)
+COMMENT_WEIGHT: float = 1.0
+# Подписка на автора засчитывается его последнему посту.
+FOLLOW_WEIGHT: float = 3.0
+# Сколько постов выводит лента и сколько кандидатов хранится:
+# запас нужен, чтобы пост, набирающий оценку, не вытеснялся сразу.
+TOP_K: int = 100
+CAPACITY: int = TOP_K * 3
+# За какой период события учитываются при полной перестройке.
+WINDOW: timedelta = timedelta(days=7)
+# Перестройка по запросу страницы ставится не чаще раза за интервал.
+REBUILD_INTERVAL: int = 60 * 5
+REBUILD_KEY: str = 'trending:rebuild'
+
+ALL_SCOPE: str = 'all'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def get_key(scope):
+    return f'trending:{scope}'
+
+
+def event_score(moment, weight):
+    return math.log(weight) + DECAY * (moment - EPOCH).total_seconds()
+
+
+def add_score(score, addition):
+    """Сумма весов в логарифмах: log(exp(score) + exp(addition))."""
+    if score is None:
+        return addition
+    high, low = max(score, addition), min(score, addition)
+    return high + math.log1p(math.exp(low - high))
+
+
+def trim(scores, capacity=CAPACITY):
+    if len(scores) <= capacity:
+        return scores
+    return dict(sorted(
+        scores.items(), key=lambda item: -item[1])[:capacity])
+
+
+def accumulate(tops, events):
+    """Добавление событий (post_id, group_id, moment, weight)
+    в топы всего сайта и групп; возвращает число событий."""
+    count = 0
+    for post_id, group_id, moment, weight in events:
+        addition = event_score(moment, weight)
+        scopes = [ALL_SCOPE]
+        if group_id is not None:
+            scopes.append(group_scope(group_id))
+        for scope in scopes:
+            scores = tops.get(scope)
+            if scores is not None:
+                scores[post_id] = add_score(scores.get(post_id), addition)
+        count += 1
+    return count
+
+
+def record(events):
+    """Учет новых событий: одно чтение и одна запись кеша.
+
+    Обновляются только уже построенные топы, отсутствующий топ
+    строится целиком при перестройке. Исключение - группа, созданная
+    после перестройки: при построенном общем топе все ее события
+    учитываются здесь, и ее топ начинается с пустого. Чтение и запись
+    не атомарны,
+    поэтому при одновременных событиях часть веса может потеряться;
+    периодическая перестройка это исправляет.
+    """
+    events = list(events)
+    scopes = {ALL_SCOPE} | {
+        group_scope(group_id) for _, group_id, _, _ in events
+        if group_id is not None}
+    stored = cache.get_many([get_key(scope) for scope in scopes])
+    tops = {scope: stored[get_key(scope)] for scope in scopes
+            if get_key(scope) in stored}
+    if ALL_SCOPE in tops:
+        for scope in scopes - tops.keys():
+            tops[scope] = {}
+    accumulate(tops, events)
+    cache.set_many({
+        get_key(scope): trim(scores) for scope, scores in tops.items()
+    }, None)
+
+
+def record_comments(comments):
+    """Новые комментарии повышают оценку своих постов."""
+    groups = dict(Post.objects.filter(
+        pk__in={comment.post_id for comment in comments}
+    ).values_list('pk', 'group_id'))
+    record(
+        (comment.post_id, groups[comment.post_id], comment.created,
+         COMMENT_WEIGHT)
+        for comment in comments if comment.post_id in groups)
+
+
+def record_follow(follow):
+    """Подписка повышает оценку последнего поста автора за WINDOW."""
+    post = Post.objects.filter(
+        author_id=follow.author_id,
+        created__gte=timezone.now() - WINDOW,
+    ).order_by('-created').values_list('pk', 'group_id').first()
+    if post is not None:
+        record([(*post, follow.created, FOLLOW_WEIGHT)])
+
+
+def get_top(scope=ALL_SCOPE, limit=TOP_K):
+    """Идентификаторы постов с наибольшей оценкой или None,
+    если топ еще не построен."""
+    scores = cache.get(get_key(scope))
+    if scores is None:
+        return None
+    return sorted(scores, key=lambda post_id: -scores[post_id])[:limit]
+
+
+def claim_rebuild():
+    """True, если перестройку по запросу можно ставить в очередь:
+    метка в кеше пропускает одну перестройку за REBUILD_INTERVAL."""
+    return cache.add(REBUILD_KEY, True, REBUILD_INTERVAL)
+
+
+def rebuild():
+    """Полная перестройка топов по событиям за WINDOW.
+
+    Единственное место с агрегацией по таблицам; выполняется
+    командой rebuild_trending или фоновой задачей, но не в запросе.
+    Возвращает количество учтенных событий.
+    """
+    since = timezone.now() - WINDOW
+    latest = {}
+    for pk, author_id, group_id in Post.objects.filter(
+            created__gte=since).order_by('created').values_list(
+            'pk', 'author_id', 'group_id').iterator():
+        latest[author_id] = (pk, group_id)
+    comments = (
+        (post_id, group_id, created, COMMENT_WEIGHT)
+        for post_id, group_id, created in Comment.objects.filter(
+            created__gte=since).values_list(
+            'post_id', 'post__group_id', 'created').iterator()
+    )
+    follows = (
+        (*latest[author_id], created, FOLLOW_WEIGHT)
+        for author_id, created in Follow.objects.filter(
+            created__gte=since).values_list(
+            'author_id', 'created').iterator()
+        if author_id in latest
+    )
+    tops = {ALL_SCOPE: {}}
+    tops.update({group_scope(group_id): {} for group_id in
+                 Group.objects.values_list('pk', flat=True)})
+    count = accumulate(tops, chain(comments, follows))
+    cache.set_many({
+        get_key(scope): trim(scores) for scope, scores in tops.items()
+    }, None)
+    return count
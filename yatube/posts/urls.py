@@ -7,8 +7,17 @@ app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/popular/',
+        views.group_popular,
+        name='group_popular'),
+    path('popular/', views.popular, name='popular'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -16,6 +25,8 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search_posts, name='search'),
+    path('export/<str:dataset>/', views.export_data, name='export'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -1,10 +1,177 @@
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
 PAGE_SIZE: int = 10
+COMMENTS_PAGE_SIZE: int = 20
+CURSOR_PARAM: str = 'cursor'
+CURSOR_NEXT: str = 'n'
+CURSOR_PREVIOUS: str = 'p'
 
 
-def get_page_context(queryset, request):
-    """Обработка паджинации страниц"""
+def encode_cursor(direction, created, pk):
+    """Упаковка позиции (created, id) в непрозрачный токен."""
+    raw = f'{direction}|{created.isoformat()}|{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Распаковка токена курсора.
+
+    Возвращает кортеж (direction, created, pk) или None,
+    если токен поврежден.
+    """
+    try:
+        direction, created, pk = force_str(
+            urlsafe_base64_decode(token)).split('|')
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if created is None or direction not in (CURSOR_NEXT, CURSOR_PREVIOUS):
+        return None
+    return direction, created, pk
+
+
+class CursorPage:
+    """Страница курсорной (keyset) паджинации по ключу (created, id).
+
+    В отличие от Paginator не выполняет COUNT(*) и OFFSET:
+    каждая страница - это один запрос с условием по ключу
+    предыдущей страницы, поэтому время ответа не зависит
+    от глубины листания. Записи могут быть объектами моделей
+    или словарями values() с ключами created и id.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(CURSOR_NEXT, *get_position(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(
+            CURSOR_PREVIOUS, *get_position(self.object_list[0]))
+
+
+def get_position(obj):
+    """Ключ (created, id) объекта модели или словаря values()."""
+    if isinstance(obj, dict):
+        return obj['created'], obj['id']
+    return obj.created, obj.pk
+
+
+def get_ordered(queryset, key='pk', after=None, ascending=False):
+    """Строки от позиции after в порядке ключа (created, key).
+
+    Порядок совпадает с индексом, поэтому страница - это проход
+    по диапазону индекса без сортировки всей выборки.
+    """
+    if after is not None:
+        created, pk = after
+        lookup = 'gt' if ascending else 'lt'
+        queryset = queryset.filter(
+            Q(**{f'created__{lookup}': created})
+            | Q(created=created, **{f'{key}__{lookup}': pk}))
+    order = ('created', key) if ascending else ('-created', f'-{key}')
+    return queryset.order_by(*order)
+
+
+def paginate_cursor(fetch, token=None, page_size=PAGE_SIZE):
+    """Страница от позиции курсора.
+
+    fetch(limit, after=None, ascending=False) возвращает до limit
+    записей от позиции after. В направлении курсора запрашивается
+    на одну запись больше размера страницы, с другой стороны от первой
+    записи страницы - одна запись: так наличие соседних страниц
+    известно без COUNT(*) и для устаревшего или подделанного курсора.
+    """
+    position = decode_cursor(token) if token else None
+    if position is None:
+        objects = fetch(page_size + 1)
+        return CursorPage(
+            objects[:page_size],
+            has_next=len(objects) > page_size,
+            has_previous=False,
+        )
+    direction, created, pk = position
+    ascending = direction == CURSOR_PREVIOUS
+    objects = fetch(page_size + 1, after=(created, pk), ascending=ascending)
+    has_more = len(objects) > page_size
+    objects = objects[:page_size]
+    if objects:
+        has_other = bool(fetch(
+            1, after=get_position(objects[0]), ascending=not ascending))
+    else:
+        # Курсор за краем выборки: все записи по другую сторону.
+        has_other = bool(fetch(1))
+    if not ascending:
+        return CursorPage(objects, has_next=has_more, has_previous=has_other)
+    objects.reverse()
+    return CursorPage(objects, has_next=has_other, has_previous=has_more)
+
+
+def get_cursor_page(queryset, token=None, page_size=PAGE_SIZE):
+    """Страница queryset от позиции курсора, новые записи сначала."""
+    def fetch(limit, after=None, ascending=False):
+        return list(get_ordered(queryset, 'pk', after, ascending)[:limit])
+    return paginate_cursor(fetch, token, page_size)
+
+
+def get_page_context(queryset, request, cursor=None):
+    """Обработка паджинации страниц.
+
+    По умолчанию используется постраничная паджинация Paginator.
+    Курсорный режим включается аргументом cursor,
+    настройкой POSTS_CURSOR_PAGINATION или наличием
+    параметра cursor в запросе. Последовательность со своим методом
+    get_cursor_page (лента подписок) выбирает страницу сама.
+    """
+    if cursor is None:
+        cursor = (getattr(settings, 'POSTS_CURSOR_PAGINATION', False)
+                  or CURSOR_PARAM in request.GET)
+    if cursor:
+        token = request.GET.get(CURSOR_PARAM)
+        if hasattr(queryset, 'get_cursor_page'):
+            page_obj = queryset.get_cursor_page(token, PAGE_SIZE)
+        else:
+            page_obj = get_cursor_page(queryset, token)
+        return {
+            'paginator': None,
+            'page_number': None,
+            'page_obj': page_obj,
+        }
     paginator = Paginator(queryset, PAGE_SIZE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
@@ -13,3 +180,17 @@ def get_page_context(queryset, request):
         'page_number': page_number,
         'page_obj': page_obj,
     }
+
+
+def get_search_context(ids, queryset, request):
+    """Паджинация ранжированного списка идентификаторов.
+
+    Из базы загружаются только объекты текущей страницы,
+    порядок релевантности сохраняется.
+    """
+    context = get_page_context(ids, request, cursor=False)
+    page_obj = context['page_obj']
+    objects = queryset.in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        objects[pk] for pk in page_obj.object_list if pk in objects]
+    return context
@@ -1,64 +1,193 @@
+from urllib.parse import urlencode
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, render, redirect
-from django.views.decorators.cache import cache_page
 
+from core.routers import read_replica
+
+from . import (caching, counters, export, search, tasks, timeline,
+               trending, writebehind)
+from .caching import cache_feed, conditional_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import get_page_context
+from .models import Comment, Follow, Group, Post, User
+from .utils import (COMMENTS_PAGE_SIZE, CURSOR_PARAM, get_cursor_page,
+                    get_page_context, get_search_context)
 
 
-@cache_page(20, key_prefix='index_page')
+@read_replica
+@cache_feed(lambda request: (caching.INDEX_SCOPE,))
 def index(request):
     """Вывод шаблона главной страницы."""
-    context = get_page_context(Post.objects.select_related(
-        'author', 'group'), request)
+    context = get_page_context(Post.objects.for_feed(), request)
     return render(request, 'posts/index.html', context)
 
 
+@read_replica
+@cache_feed(lambda request, slug: (caching.group_scope(slug),))
 def group_posts(request, slug):
     """Вывод шаблона постовотфильтрованных по группам."""
     group = get_object_or_404(Group, slug=slug)
     context = {
         'group': group,
     }
-    context.update(get_page_context(group.group_posts.all(), request))
+    context.update(get_page_context(
+        Post.objects.for_feed().filter(group=group), request))
     return render(request, 'posts/group_list.html', context)
 
 
+@read_replica
+@cache_feed(lambda request, username: (caching.author_scope(username),))
 def profile(request, username):
     """Вывод шаблона профайла пользователя:
     на ней будет отображаться информация об авторе и его посты.
     """
-    author = get_object_or_404(User, username=username)
-    amount = author.posts.all().count()
-    following = False
-    following = (request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author).exists())
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    amount = counters.get_profile(author).posts_count
+    following = writebehind.get_pending_follow(request.user, author)
+    if following is None:
+        following = (request.user.is_authenticated and Follow.objects.filter(
+            user=request.user, author=author).exists())
     context = {
         'author': author,
         'amount': amount,
         'following': following,
     }
-    context.update(get_page_context(author.posts.all(), request))
+    context.update(get_page_context(
+        Post.objects.for_feed().filter(author=author), request))
     return render(request, 'posts/profile.html', context)
 
 
+@read_replica
+def search_posts(request):
+    """Вывод шаблона с результатами поиска по постам и комментариям."""
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    context.update(get_search_context(
+        search.search_posts(query), Post.objects.for_feed(), request))
+    return render(request, 'posts/search.html', context)
+
+
+def get_trending_context(scope, queryset, request):
+    """Страница популярных постов из готового топа в кеше.
+
+    Топа группы нет, пока в ней не было событий, - лента пуста.
+    Если не построен и общий топ, перестройка ставится в очередь
+    не чаще раза в trending.REBUILD_INTERVAL, а лента пока пуста:
+    агрегировать таблицы в запросе нельзя.
+    """
+    ids = trending.get_top(scope)
+    if ids is None:
+        ids = []
+        if ((scope == trending.ALL_SCOPE or trending.get_top() is None)
+                and trending.claim_rebuild()):
+            tasks.rebuild_trending.delay()
+    return get_search_context(ids, queryset, request)
+
+
+@read_replica
+def popular(request):
+    """Вывод шаблона популярных постов: больше всего новых
+    комментариев и подписок на автора за последнее время."""
+    context = get_trending_context(
+        trending.ALL_SCOPE, Post.objects.for_feed(), request)
+    return render(request, 'posts/popular.html', context)
+
+
+@read_replica
+def group_popular(request, slug):
+    """Вывод шаблона популярных постов группы."""
+    group = get_object_or_404(Group, slug=slug)
+    context = {
+        'group': group,
+    }
+    context.update(get_trending_context(
+        trending.group_scope(group.pk),
+        Post.objects.for_feed().filter(group=group), request))
+    return render(request, 'posts/popular.html', context)
+
+
+def get_post_scopes(request, post_id):
+    """Области страницы поста: сам пост, его автор и группа."""
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug').first()
+    if row is None:
+        return (caching.post_scope(post_id),)
+    username, slug = row
+    scopes = [caching.post_scope(post_id), caching.author_scope(username)]
+    if slug:
+        scopes.append(caching.group_scope(slug))
+    return scopes
+
+
+@read_replica
+@conditional_feed(get_post_scopes)
 def post_detail(request, post_id):
     """Вывод шаблона для просмотра отдельного поста"""
     posts = get_object_or_404(
-        Post.objects.select_related('author'), pk=post_id)
-    amount = posts.author.posts.count()
+        Post.objects.for_feed().select_related('author__profile'),
+        pk=post_id)
+    amount = counters.get_profile(posts.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = posts.comments.all()
+    comments = get_comments_page(posts.pk, request)
+    pending_comments = []
+    if not comments.has_previous():
+        pending_comments = writebehind.get_pending_comments(
+            posts.pk, request.user)
     context = {
         'posts': posts,
         'amount': amount,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'pending_comments': pending_comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def get_comments_page(post_id, request):
+    """Страница комментариев поста от курсора, новые сначала."""
+    return get_cursor_page(
+        Comment.objects.select_related('author').filter(post_id=post_id),
+        request.GET.get(CURSOR_PARAM),
+        COMMENTS_PAGE_SIZE,
+    )
+
+
+@read_replica
+def post_comments(request, post_id):
+    """Подгрузка более ранних комментариев.
+
+    По умолчанию возвращает HTML-фрагмент для вставки на страницу поста,
+    с параметром format=json - комментарии в JSON.
+    """
+    posts = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = get_comments_page(posts.pk, request)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'posts': posts,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     """Вывод шаблона для публикации постов"""
@@ -98,7 +227,10 @@ def post_edit(request, post_id):
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    if form.is_valid() and writebehind.is_enabled():
+        writebehind.enqueue_comment(
+            post, request.user, form.cleaned_data['text'])
+    elif form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
@@ -106,27 +238,69 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_replica
 @login_required
+@cache_feed(lambda request: (caching.follow_scope(request.user.pk),))
 def follow_index(request):
-    post = Post.objects.filter(
-        author__following__user=request.user)
-    context = get_page_context(post, request)
+    context = get_page_context(
+        timeline.get_follow_feed(request.user), request)
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author:
+    if request.user != author and writebehind.is_enabled():
+        writebehind.enqueue_follow(request.user, author)
+    elif request.user != author:
         Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
+    if writebehind.is_enabled():
+        author = get_object_or_404(User, username=username)
+        writebehind.enqueue_follow(request.user, author, writebehind.UNFOLLOW)
+        return redirect('posts:profile', username=username)
     follow = get_object_or_404(
-        Follow,
+        Follow.objects.select_related('user', 'author'),
         user=request.user,
         author__username=username)
     follow.delete()
     return redirect('posts:profile', username=username)
+
+
+@staff_member_required
+def export_data(request, dataset):
+    """Потоковая выгрузка набора данных для персонала.
+
+    Параметры: format=ndjson|csv, since - отметка предыдущей выгрузки,
+    gzip=1 - сжатие. Отметка для следующей выгрузки передается
+    в заголовке X-Export-Watermark.
+    """
+    if dataset not in export.DATASETS:
+        raise Http404
+    file_format = request.GET.get('format', export.NDJSON)
+    if file_format not in export.FORMATS:
+        return HttpResponseBadRequest('Неизвестный формат')
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = export.parse_watermark(request.GET['since'])
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+    until = export.get_watermark(dataset, since)
+    chunks = export.render(
+        dataset, export.get_rows(dataset, since, until), file_format)
+    filename = f'{dataset}.{file_format}'
+    content_type = export.CONTENT_TYPES[file_format]
+    if request.GET.get('gzip') == '1':
+        chunks = export.compress(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if until is not None:
+        response['X-Export-Watermark'] = str(until)
+    return response
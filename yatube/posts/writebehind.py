@@ -0,0 +1,384 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.models import Profile
+
+from . import caching, search, timeline, trending
+from .counters import increment
+from .models import AppliedWrite, Comment, Follow, Post, User
+from .seeding import insert
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FILE: str = 'queue.ndjson'
+BATCH_PATTERN: str = 'batch-*.ndjson'
+LOCK_FILE: str = 'flush.lock'
+# Время жизни меток ожидающих записей: за это время
+# очередь должна быть разобрана.
+PENDING_TIMEOUT: int = 60 * 10
+# Сколько хранятся токены примененных записей: пакет, оставшийся
+# после сбоя, разбирается следующим запуском задолго до этого срока.
+APPLIED_TIMEOUT: timedelta = timedelta(days=1)
+TOKEN_BATCH_SIZE: int = 500
+
+COMMENT: str = 'comment'
+FOLLOW: str = 'follow'
+UNFOLLOW: str = 'unfollow'
+
+
+def is_enabled():
+    return getattr(settings, 'WRITE_BEHIND', False)
+
+
+def get_directory():
+    directory = settings.WRITE_BEHIND_DIR
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def append(record):
+    """Дописывание записи в файл очереди.
+
+    Запись делается под эксклюзивной блокировкой и сбрасывается
+    на диск до ответа пользователю. Если разборщик переименовал
+    файл, пока запрос ждал блокировку, строка пишется в новый файл:
+    переименованный файл уже может быть прочитан.
+    """
+    line = (json.dumps(record, ensure_ascii=False) + '\n').encode()
+    path = os.path.join(get_directory(), QUEUE_FILE)
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                current = os.stat(path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current == os.fstat(fd).st_ino:
+                os.write(fd, line)
+                os.fsync(fd)
+                return
+        finally:
+            os.close(fd)
+
+
+def rotate():
+    """Переименование файла очереди в пакет для разбора.
+
+    Новые записи после этого попадают в новый файл очереди.
+    Возвращает путь к пакету или None, если очередь пуста.
+    """
+    directory = get_directory()
+    path = os.path.join(directory, QUEUE_FILE)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        if not os.fstat(fd).st_size:
+            return None
+        batch = os.path.join(directory, f'batch-{time.time_ns()}.ndjson')
+        os.rename(path, batch)
+        return batch
+    finally:
+        os.close(fd)
+
+
+def read_batch(path):
+    """Записи пакета; оборванная при сбое строка пропускается."""
+    records = []
+    with open(path, encoding='utf-8') as batch:
+        for number, line in enumerate(batch, 1):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning('Пропущена поврежденная строка %s:%s',
+                               path, number)
+    return records
+
+
+def pending_comments_key(post_id, user_id):
+    """Счетчик ожидающих комментариев пользователя к посту."""
+    return f'pending_comments:{post_id}:{user_id}'
+
+
+def pending_comment_key(post_id, user_id, slot):
+    """Метка одного ожидающего комментария."""
+    return f'{pending_comments_key(post_id, user_id)}:{slot}'
+
+
+def next_slot(key):
+    """Номер новой метки атомарным увеличением счетчика в кеше:
+    у одновременных запросов номера разные, и ни одна метка
+    не теряется, как при чтении и перезаписи общего списка."""
+    cache.add(key, 0, PENDING_TIMEOUT)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Счетчик вытеснен между add и incr.
+        cache.set(key, 1, PENDING_TIMEOUT)
+        return 1
+
+
+def pending_follow_key(user_id, author_id):
+    return f'pending_follow:{user_id}:{author_id}'
+
+
+def enqueue_comment(post, author, text):
+    """Комментарий в очередь; автор видит его сразу по метке в кеше."""
+    record = {
+        'kind': COMMENT,
+        'token': uuid.uuid4().hex,
+        'post': post.pk,
+        'author': author.pk,
+        'text': text,
+        'created': timezone.now().isoformat(),
+        'slot': next_slot(pending_comments_key(post.pk, author.pk)),
+    }
+    append(record)
+    cache.set(pending_comment_key(post.pk, author.pk, record['slot']),
+              record, PENDING_TIMEOUT)
+    caching.invalidate(caching.post_scope(post.pk))
+    return record
+
+
+def enqueue_follow(user, author, kind=FOLLOW):
+    """Подписка или отписка в очередь; до разбора очереди
+    профиль автора показывает пользователю новое состояние."""
+    record = {
+        'kind': kind,
+        'token': uuid.uuid4().hex,
+        'user': user.pk,
+        'author': author.pk,
+        'created': timezone.now().isoformat(),
+    }
+    append(record)
+    cache.set(pending_follow_key(user.pk, author.pk), record,
+              PENDING_TIMEOUT)
+    caching.invalidate(caching.author_scope(author.username),
+                       caching.author_scope(user.username))
+    return record
+
+
+def get_pending_comments(post_id, user):
+    """Еще не записанные в базу комментарии пользователя к посту,
+    новые сначала."""
+    if not is_enabled() or not user.is_authenticated:
+        return []
+    count = cache.get(pending_comments_key(post_id, user.pk))
+    if not count:
+        return []
+    keys = [pending_comment_key(post_id, user.pk, slot)
+            for slot in range(count, 0, -1)]
+    records = cache.get_many(keys)
+    return [
+        Comment(post_id=post_id, author=user, text=records[key]['text'],
+                created=parse_datetime(records[key]['created']))
+        for key in keys if key in records
+    ]
+
+
+def get_pending_follow(user, author):
+    """True или False для ожидающей подписки или отписки,
+    None - если в очереди ничего нет."""
+    if not is_enabled() or not user.is_authenticated:
+        return None
+    record = cache.get(pending_follow_key(user.pk, author.pk))
+    if record is None:
+        return None
+    return record['kind'] == FOLLOW
+
+
+def clear_pending(records):
+    """Снятие меток записей, перенесенных в базу. Метки записей,
+    добавленных после чтения пакета, остаются."""
+    tokens = {record['token'] for record in records}
+    keys = {
+        pending_comment_key(record['post'], record['author'], record['slot'])
+        for record in records if record['kind'] == COMMENT
+    }
+    keys.update(
+        pending_follow_key(record['user'], record['author'])
+        for record in records if record['kind'] != COMMENT
+    )
+    cache.delete_many([
+        key for key, record in cache.get_many(keys).items()
+        if record['token'] in tokens
+    ])
+
+
+def existing(model, ids):
+    return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def apply_comments(records):
+    """Вставка комментариев и то, что для каждого из них делают
+    фоновые задачи: счетчики постов, поисковый индекс и оценки
+    популярности, но одним запросом на пост и одной вставкой в индекс."""
+    post_ids = existing(Post, {record['post'] for record in records})
+    author_ids = existing(User, {record['author'] for record in records})
+    comments = insert(Comment, [
+        Comment(post_id=record['post'], author_id=record['author'],
+                text=record['text'],
+                created=parse_datetime(record['created']))
+        for record in records
+        if record['post'] in post_ids and record['author'] in author_ids
+    ])
+    counts = Counter(comment.post_id for comment in comments)
+    for post_id, count in counts.items():
+        increment(Post.objects.filter(pk=post_id), 'comments_count', count)
+    search.get_backend().insert_many([
+        (comment.post_id, comment.pk, comment.text) for comment in comments])
+    trending.record_comments(comments)
+    return list(counts)
+
+
+def apply_follows(records):
+    """Подписки и отписки: для каждой пары учитывается последняя
+    запись пакета. Возвращает пары (user_id, author_id),
+    состояние которых изменилось."""
+    latest = {}
+    for record in records:
+        latest[record['user'], record['author']] = record
+    user_ids = existing(User, {pk for pair in latest for pk in pair})
+    pairs = [pair for pair in latest
+             if pair[0] != pair[1] and set(pair) <= user_ids]
+    if not pairs:
+        return []
+    current = {
+        (follow.user_id, follow.author_id): follow
+        for follow in Follow.objects.select_related('user', 'author').filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs})
+        if (follow.user_id, follow.author_id) in latest
+    }
+    follows = insert(Follow, [
+        Follow(user_id=user_id, author_id=author_id,
+               created=parse_datetime(latest[user_id, author_id]['created']))
+        for user_id, author_id in pairs
+        if latest[user_id, author_id]['kind'] == FOLLOW
+        and (user_id, author_id) not in current
+    ])
+    for field, counts in (
+            ('followers_count', Counter(f.author_id for f in follows)),
+            ('following_count', Counter(f.user_id for f in follows))):
+        for user_id, count in counts.items():
+            increment(Profile.objects.filter(user_id=user_id), field, count)
+    for author_id in {follow.author_id for follow in follows}:
+        timeline.sync_fanout(author_id)
+    for follow in follows:
+        timeline.backfill(follow)
+        trending.record_follow(follow)
+    removed = [
+        follow for pair, follow in current.items()
+        if latest[pair]['kind'] == UNFOLLOW
+    ]
+    for follow in removed:
+        # Отписок немного: счетчики и ленты обновят сигналы удаления.
+        follow.delete()
+    return [(follow.user_id, follow.author_id)
+            for follow in follows + removed]
+
+
+def get_applied(tokens):
+    """Токены, уже перенесенные в базу."""
+    applied = set()
+    for start in range(0, len(tokens), TOKEN_BATCH_SIZE):
+        applied.update(AppliedWrite.objects.filter(
+            token__in=tokens[start:start + TOKEN_BATCH_SIZE]
+        ).values_list('token', flat=True))
+    return applied
+
+
+@transaction.atomic
+def apply(records):
+    """Перенос пакета записей в базу одной транзакцией.
+
+    Токены записей сохраняются в той же транзакции, уже примененные
+    записи пропускаются: повторный разбор пакета ничего не дублирует.
+    """
+    applied = get_applied([record['token'] for record in records])
+    records = [record for record in records
+               if record['token'] not in applied]
+    AppliedWrite.objects.bulk_create(
+        [AppliedWrite(token=record['token']) for record in records],
+        batch_size=TOKEN_BATCH_SIZE)
+    post_ids = apply_comments(
+        [record for record in records if record['kind'] == COMMENT])
+    pairs = apply_follows(
+        [record for record in records if record['kind'] != COMMENT])
+    return post_ids, pairs
+
+
+def invalidate(post_ids, pairs):
+    """Сброс кеша страниц после фиксации транзакции, чтобы
+    страницы не были заново закешированы со старыми данными."""
+    for post in Post.objects.select_related('author').filter(
+            pk__in=post_ids):
+        caching.invalidate_post(post)
+    user_ids = {user_id for pair in pairs for user_id in pair}
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list(
+        'pk', 'username'))
+    scopes = {caching.follow_scope(user_id) for user_id, _ in pairs}
+    scopes.update(caching.author_scope(username)
+                  for username in usernames.values())
+    if scopes:
+        caching.invalidate(*scopes)
+
+
+@contextmanager
+def flush_lock():
+    """Неблокирующая блокировка разборщика: одновременно
+    очередь разбирает только один процесс."""
+    fd = os.open(os.path.join(get_directory(), LOCK_FILE),
+                 os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+def flush():
+    """Разбор очереди; возвращает количество прочитанных записей.
+
+    Сначала разбираются пакеты, оставшиеся от прерванного запуска.
+    Пакет удаляется после фиксации транзакции; если сбой случился
+    между ними, при повторном разборе примененные записи узнаются
+    по токенам. Токены старше APPLIED_TIMEOUT удаляются.
+    """
+    with flush_lock() as acquired:
+        if not acquired:
+            return 0
+        rotate()
+        done = 0
+        for path in sorted(glob.glob(
+                os.path.join(get_directory(), BATCH_PATTERN))):
+            records = read_batch(path)
+            post_ids, pairs = apply(records)
+            os.remove(path)
+            invalidate(post_ids, pairs)
+            clear_pending(records)
+            done += len(records)
+        AppliedWrite.objects.filter(
+            applied__lt=timezone.now() - APPLIED_TIMEOUT).delete()
+        return done
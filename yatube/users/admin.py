@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import Profile
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'posts_count',
+        'followers_count',
+        'following_count'
+    )
+    search_fields = ('user__username',)
+    readonly_fields = (
+        'posts_count',
+        'followers_count',
+        'following_count'
+    )
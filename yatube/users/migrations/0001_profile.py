@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_by(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('user')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def create_profiles(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Profile = apps.get_model('users', 'Profile')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Profile.objects.bulk_create(
+        [Profile(user_id=user_id)
+         for user_id in User.objects.values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+    Profile.objects.update(
+        posts_count=count_by(Post.objects, 'author'),
+        followers_count=count_by(Follow.objects, 'author'),
+        following_count=count_by(Follow.objects, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0005_auto_20220630_1339'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+        ),
+        migrations.RunPython(create_profiles, migrations.RunPython.noop),
+    ]
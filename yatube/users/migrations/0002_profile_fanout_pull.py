@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+# posts.timeline.FANOUT_MAX_FOLLOWERS на момент миграции.
+FANOUT_MAX_FOLLOWERS = 1000
+
+
+def mark_pulled(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    Profile.objects.filter(
+        followers_count__gt=FANOUT_MAX_FOLLOWERS).update(fanout_pull=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='fanout_pull',
+            field=models.BooleanField(default=False, verbose_name='Посты читаются подписчиками при запросе'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
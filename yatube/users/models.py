@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class Profile(models.Model):
+    """Профиль автора с денормализованными счетчиками.
+
+    Счетчики обновляются сигналами при создании и удалении постов
+    и подписок, расхождения исправляет команда reconcile_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Количество постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0)
+    following_count = models.PositiveIntegerField(
+        'Количество подписок', default=0)
+    fanout_pull = models.BooleanField(
+        'Посты читаются подписчиками при запросе', default=False)
+
+    def __str__(self):
+        return f'Профиль {self.user}'
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -27,7 +28,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# При DEBUG Django хранит в памяти все выполненные запросы.
+DEBUG = bool(int(os.getenv('DEBUG', 1)))
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -35,6 +37,8 @@ ALLOWED_HOSTS = [
     '[::1]',
     'testserver',
 ]
+if os.getenv('ALLOWED_HOSTS'):
+    ALLOWED_HOSTS += os.getenv('ALLOWED_HOSTS').split(',')
 
 
 # Application definition
@@ -50,10 +54,13 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +68,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -89,11 +97,60 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Профили базы данных, выбираются переменной DATABASE_PROFILE.
+# CONN_MAX_AGE - время жизни постоянного соединения в секундах
+# (0 - соединение на каждый запрос).
+CONN_MAX_AGE = int(os.getenv('CONN_MAX_AGE', 60))
+DATABASE_PROFILES = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.getenv(
+            'DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+    },
+    # PostgreSQL за пулом соединений pgbouncer (transaction pooling):
+    # серверные курсоры в этом режиме не работают.
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DATABASE_NAME', 'yatube'),
+        'USER': os.getenv('DATABASE_USER', 'yatube'),
+        'PASSWORD': os.getenv('DATABASE_PASSWORD', ''),
+        'HOST': os.getenv('DATABASE_HOST', '127.0.0.1'),
+        'PORT': os.getenv('DATABASE_PORT', '6432'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'DISABLE_SERVER_SIDE_CURSORS': bool(int(
+            os.getenv('DATABASE_POOLED', 1))),
+    },
+}
+DATABASES = {
+    'default': DATABASE_PROFILES[os.getenv('DATABASE_PROFILE', 'sqlite')],
+}
+
+# Реплики для чтения лент: DATABASE_REPLICAS - пути к файлам SQLite
+# или хосты PostgreSQL через запятую. Схема реплик совпадает
+# с основной базой, в тестах они подменяются ею (MIRROR).
+REPLICA_DATABASES = []
+for number, location in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1):
+    alias = f'replica{number}'
+    location_key = (
+        'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+        else 'HOST')
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        location_key: location,
+        'TEST': {'MIRROR': 'default'},
     }
+    REPLICA_DATABASES.append(alias)
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Прагмы для каждого нового соединения SQLite (см. core/db.py).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
 }
 
 
@@ -148,9 +205,79 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
-# Настройка подсистемы кэширования
-CACHES = {
-    'default': {
+# Настройка подсистемы кэширования.
+# LocMemCache свой у каждого процесса, поэтому при нескольких
+# воркерах gunicorn нужен общий профиль: file или memcached.
+CACHE_PROFILES = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'yatube_cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', '127.0.0.1:11211'),
+    },
+    'dummy': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+CACHES = {
+    'default': CACHE_PROFILES[os.getenv('CACHE_PROFILE', 'locmem')],
+}
+
+# Курсорная паджинация лент вместо постраничной
+POSTS_CURSOR_PAGINATION = False
+
+# Нормализация загружаемых изображений постов
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_FORMAT = os.getenv('POST_IMAGE_FORMAT', 'JPEG')
+POST_IMAGE_QUALITY = int(os.getenv('POST_IMAGE_QUALITY', 85))
+
+# Профилирование запросов: доля запросов в выборке (0 - выключено)
+# и отдача сводки в заголовке Server-Timing.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SERVER_TIMING = bool(int(os.getenv('PROFILING_SERVER_TIMING', 0)))
+
+# Поиск повторяющихся (N+1) и медленных запросов: '' - выключен,
+# 'log' - предупреждения в лог yatube.queries, 'raise' - ошибка.
+QUERY_INSPECTOR = os.getenv('QUERY_INSPECTOR', '')
+QUERY_DUPLICATE_THRESHOLD = 3
+QUERY_SLOW_MS = float(os.getenv('QUERY_SLOW_MS', 100))
+
+# Фоновые задачи после записи (счетчики, ленты, поиск, миниатюры)
+# выполняются после коммита; TASKS_EAGER выполняет их сразу в запросе.
+TASKS_EAGER = bool(int(os.getenv('TASKS_EAGER', 0)))
+
+# Отложенная запись комментариев и подписок: запросы только дописывают
+# их в файл очереди, в базу пакетами их переносит manage.py flush_writes.
+WRITE_BEHIND = bool(int(os.getenv('WRITE_BEHIND', 0)))
+WRITE_BEHIND_DIR = os.getenv(
+    'WRITE_BEHIND_DIR', os.path.join(BASE_DIR, 'write_behind'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'yatube.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }